@@ -0,0 +1,175 @@
+"""
+Benchmarks for the client, run against a simulated device on localhost.
+
+  python -m benchmarks.run_benchmarks [--latency 0.005] [--rounds 20] [--depths 1 8]
+
+Measures the full refresh time, commands per second, response parse throughput, memory
+allocated per received frame and event dispatch overhead.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import tracemalloc
+from typing import List
+
+from oppoudpsdk import EVENT_DEVICE_STATE_UPDATED, EVENT_READY, OppoClient, OppoQueryCommand
+from oppoudpsdk.codes import OppoQueryCode
+from oppoudpsdk.response import get_response
+from oppoudpsdk.simulator import OppoSimulatedDevice
+
+#a representative mix of received frames (verbose mode time updates dominate)
+FRAMES = [
+  b"@UTC 001 002 E 00:01:02\r",
+  b"@UTC 001 002 E 00:01:03\r",
+  b"@UTC 001 002 E 00:01:04\r",
+  b"@UPL PLAY\r",
+  b"@QVL OK 25\r",
+  b"@QTK OK 01/05\r",
+  b"@QEL OK 00:01:02\r",
+  b"@UVL 30\r",
+]
+
+def report(name: str, value: float, unit: str):
+  print(f"{name:<40} {value:>14,.3f} {unit}")
+
+async def connect(latency: float, pipeline_depth: int):
+  """Starts a simulated device and a client connected to it, waiting for the initial refresh"""
+  device = OppoSimulatedDevice(latency=latency, utc_interval=None)
+  await device.start()
+  client = OppoClient("127.0.0.1", device.port, pipeline_depth=pipeline_depth)
+  ready = asyncio.Event()
+  client.add_event_handler(EVENT_READY, lambda c: ready.set())
+  task = asyncio.ensure_future(client.async_run_client())
+  await ready.wait()
+  #the device reports it's on, which triggers a full refresh
+  await asyncio.sleep(latency * 100 + 0.1)
+  while client.device.is_updating:
+    await asyncio.sleep(0.01)
+  return device, client, task
+
+async def disconnect(device: OppoSimulatedDevice, client: OppoClient, task: asyncio.Task):
+  await client.disconnect()
+  await task
+  await device.stop()
+
+async def bench_full_refresh(latency: float, pipeline_depth: int, rounds: int):
+  device, client, task = await connect(latency, pipeline_depth)
+  try:
+    timings = []
+    for _ in range(rounds):
+      start = time.perf_counter()
+      await client.device.async_request_update()
+      timings.append(time.perf_counter() - start)
+    report(f"full refresh (depth {pipeline_depth})", statistics.mean(timings) * 1000, "ms")
+  finally:
+    await disconnect(device, client, task)
+
+async def bench_commands_per_second(latency: float, pipeline_depth: int, count: int):
+  device, client, task = await connect(latency, pipeline_depth)
+  try:
+    #batches of distinct queries, identical queries sent together would share a response
+    commands = [OppoQueryCommand(code) for code in OppoQueryCode if code not in [OppoQueryCode.QCD, OppoQueryCode.QDR]]
+    batches = max(1, count // len(commands))
+    start = time.perf_counter()
+    for _ in range(batches):
+      await asyncio.gather(*[client.async_send_command(command) for command in commands])
+    elapsed = time.perf_counter() - start
+    report(f"commands/sec (depth {pipeline_depth})", batches * len(commands) / elapsed, "cmd/s")
+  finally:
+    await disconnect(device, client, task)
+
+def bench_parse(count: int):
+  frames = FRAMES * (count // len(FRAMES))
+  start = time.perf_counter()
+  for frame in frames:
+    get_response(frame).value
+  elapsed = time.perf_counter() - start
+  report("response parse throughput", len(frames) / elapsed, "frames/s")
+
+def _process_frames(client: OppoClient, count: int) -> List[bytes]:
+  """Gets a stream of frames for a playing device, so time updates aren't treated as discontinuities"""
+  pa = client.device.playback_attributes
+  pa.track, pa.chapter = 1, 2
+  frames = []
+  for i in range(count):
+    if i % 10 == 9:
+      frames.append(b"@UVL 30\r")
+    else:
+      seconds = i % 3600
+      frames.append(f"@UTC 001 002 E 00:{seconds // 60:02}:{seconds % 60:02}\r".encode())
+  return frames
+
+async def bench_frame_processing(count: int):
+  client = OppoClient("127.0.0.1")
+  frames = _process_frames(client, count)
+  process = client._process_message
+
+  start = time.perf_counter()
+  for frame in frames:
+    process(frame)
+  elapsed = time.perf_counter() - start
+  report("frame processing throughput", len(frames) / elapsed, "frames/s")
+
+  #memory allocated while processing each frame (released or not), needs python 3.9+
+  if not hasattr(tracemalloc, "reset_peak"):
+    return
+  tracemalloc.start()
+  try:
+    allocated = 0
+    for frame in frames[:1000]:
+      before, _ = tracemalloc.get_traced_memory()
+      tracemalloc.reset_peak()
+      process(frame)
+      _, peak = tracemalloc.get_traced_memory()
+      allocated += peak - before
+  finally:
+    tracemalloc.stop()
+  report("memory allocated per frame", allocated / min(len(frames), 1000), "bytes")
+
+async def bench_dispatch(count: int, handlers: int):
+  client = OppoClient("127.0.0.1")
+  device = client.device
+  for _ in range(handlers):
+    client.add_event_handler(EVENT_DEVICE_STATE_UPDATED, lambda d: None)
+  start = time.perf_counter()
+  for _ in range(count):
+    client.fire_event(EVENT_DEVICE_STATE_UPDATED, device)
+  elapsed = time.perf_counter() - start
+  report(f"event dispatch ({handlers} sync handlers)", elapsed / count * 1e6, "us/event")
+
+  client.clear_event_handlers()
+  async def handler(d):
+    pass
+  for _ in range(handlers):
+    client.add_event_handler(EVENT_DEVICE_STATE_UPDATED, handler)
+  start = time.perf_counter()
+  for _ in range(count):
+    client.fire_event(EVENT_DEVICE_STATE_UPDATED, device)
+  await asyncio.sleep(0)
+  elapsed = time.perf_counter() - start
+  report(f"event dispatch ({handlers} async handlers)", elapsed / count * 1e6, "us/event")
+
+async def main(args: argparse.Namespace):
+  print(f"latency {args.latency * 1000:.1f}ms, {args.rounds} rounds")
+  for depth in args.depths:
+    await bench_full_refresh(args.latency, depth, args.rounds)
+  for depth in args.depths:
+    await bench_commands_per_second(args.latency, depth, args.commands)
+  bench_parse(args.frames)
+  await bench_frame_processing(args.frames)
+  await bench_dispatch(args.events, args.handlers)
+
+def parse_args() -> argparse.Namespace:
+  parser = argparse.ArgumentParser(description="Benchmarks the client against a simulated device")
+  parser.add_argument("--latency", type=float, default=0.005, help="simulated device response latency in seconds")
+  parser.add_argument("--rounds", type=int, default=20, help="number of full refreshes to time")
+  parser.add_argument("--depths", type=int, nargs="+", default=[1, 8], help="pipeline depths to benchmark")
+  parser.add_argument("--commands", type=int, default=2000, help="number of commands to send")
+  parser.add_argument("--frames", type=int, default=100000, help="number of frames to parse/process")
+  parser.add_argument("--events", type=int, default=100000, help="number of events to dispatch")
+  parser.add_argument("--handlers", type=int, default=5, help="number of handlers per event")
+  return parser.parse_args()
+
+if __name__ == "__main__":
+  asyncio.run(main(parse_args()))
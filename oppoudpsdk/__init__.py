@@ -7,5 +7,11 @@
 from .exceptions import *
 from .command import *
 from .response.enums import *
+from .cache import OppoResponseCache
 from .client import OppoClient
 from .device import OppoDevice, OppoPlaybackStatus
+from .disc_cache import OppoDiscCache
+from .metrics import OppoHistogram, OppoMetrics, export_prometheus
+from .pool import OppoClientPool, OppoClientStats
+from .scheduler import OppoAdaptiveRefreshScheduler, OppoRefreshScheduler
+from .tracing import OppoMemoryTracer, OppoSpan, set_tracer
@@ -0,0 +1,107 @@
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .codes import OppoCode, OppoQueryCode
+from .command import OppoCommand, OppoQueryCommand
+from .response import OppoResponse, ResultCode
+
+#default time to live (in seconds) for queries whose answers rarely change
+DEFAULT_CACHE_TTLS = {
+  OppoQueryCode.QVR: 24 * 60 * 60,
+  OppoQueryCode.QDT: 5 * 60,
+  OppoQueryCode.QHD: 5 * 60,
+  OppoQueryCode.QHR: 5 * 60,
+  OppoQueryCode.QIS: 5 * 60,
+}  # type: Dict[OppoQueryCode, float]
+
+#received codes that invalidate cached queries (None invalidates everything)
+DEFAULT_CACHE_INVALIDATIONS = {
+  OppoCode.UPW: None,
+  OppoCode.POW: None,
+  OppoCode.PON: None,
+  OppoCode.POF: None,
+  OppoCode.UDT: [OppoQueryCode.QDT],
+  OppoCode.EJT: [OppoQueryCode.QDT],
+  OppoCode.UIS: [OppoQueryCode.QIS],
+  OppoCode.SIS: [OppoQueryCode.QIS],
+  OppoCode.SHD: [OppoQueryCode.QHD],
+  OppoCode.HDM: [OppoQueryCode.QHD],
+  OppoCode.SHR: [OppoQueryCode.QHR],
+  OppoCode.HDR: [OppoQueryCode.QHR],
+}  # type: Dict[OppoCode, Optional[List[OppoQueryCode]]]
+
+class OppoResponseCache:
+  """
+  Caches the responses to idempotent queries.  Each cacheable query code has a time to live,
+  and cached responses are dropped early when the device reports a related update.
+  Only plain queries (no parameters) are cached.
+  """
+  def __init__(
+    self,
+    ttls: Optional[Dict[OppoQueryCode, float]] = None,
+    invalidations: Optional[Dict[OppoCode, Optional[Iterable[OppoQueryCode]]]] = None,
+    clock: Callable[[], float] = time.monotonic
+  ):
+    if ttls is None:
+      ttls = DEFAULT_CACHE_TTLS
+    if invalidations is None:
+      invalidations = DEFAULT_CACHE_INVALIDATIONS
+
+    self._ttls = { code.value: ttl for code, ttl in ttls.items() }  # type: Dict[str, float]
+    self._invalidations = {
+      code: None if codes is None else [c.value for c in codes]
+      for code, codes in invalidations.items()
+    }  # type: Dict[OppoCode, Optional[List[str]]]
+    self._clock = clock
+    self._entries = {}  # type: Dict[str, Tuple[float, OppoResponse]]
+    self.hits = 0
+    self.misses = 0
+
+  def __len__(self) -> int:
+    return len(self._entries)
+
+  def is_cacheable(self, command: OppoCommand) -> bool:
+    """Indicates whether the command's response can be cached"""
+    return (
+      type(command) is OppoQueryCommand and
+      not command._parameters and
+      command.code.value in self._ttls
+    )
+
+  def get(self, command: OppoCommand) -> Optional[OppoResponse]:
+    """Gets the cached response for a command, or None if there isn't a fresh one"""
+    if not self.is_cacheable(command):
+      return None
+    entry = self._entries.get(command.code.value)
+    if entry is not None:
+      expires_at, response = entry
+      if expires_at > self._clock():
+        self.hits += 1
+        return response
+      del self._entries[command.code.value]
+    self.misses += 1
+    return None
+
+  def put(self, command: OppoCommand, response: OppoResponse):
+    """Caches the response to a command (if it's cacheable)"""
+    if response.result == ResultCode.OK and self.is_cacheable(command):
+      code = command.code.value
+      self._entries[code] = (self._clock() + self._ttls[code], response)
+
+  def invalidate(self, codes: Optional[Iterable[OppoQueryCode]] = None):
+    """Drops the cached responses for the given codes (or all of them)"""
+    if codes is None:
+      self._entries.clear()
+    else:
+      for code in codes:
+        self._entries.pop(code.value, None)
+
+  def on_message_received(self, response: OppoResponse):
+    """Drops cached responses invalidated by a received message"""
+    if self._entries and response.code in self._invalidations:
+      codes = self._invalidations[response.code]
+      if codes is None:
+        self._entries.clear()
+      else:
+        for code in codes:
+          self._entries.pop(code, None)
@@ -1,16 +1,24 @@
 import asyncio
 from asyncio.exceptions import InvalidStateError
 import logging
+import random
+from functools import partial
 from typing import Callable, DefaultDict, Dict, List, Optional, Tuple
 
 from .codes import *
 from .command import *
 from .const import *
+from .cache import OppoResponseCache
 from .device import OppoDevice
-from .exceptions import OppoCommandError, OppoInvalidStateError
+from .disc_cache import OppoDiscCache
+from .dispatch import OppoEventCoalescer, run_event_handlers
+from .exceptions import OppoCommandError, OppoCommandTimeoutError, OppoInvalidStateError
+from .metrics import OppoMetrics
+from . import tracing
 from .response import *
+from .pipeline import OppoCommandPipeline, OppoCommandQueue
 from .states import OppoClientState
-from .async_helpers import OppoStreamIterator, CancellableAsyncIterator
+from .protocol import DEFAULT_MAX_WRITE_BATCH, OppoProtocol
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -20,28 +28,73 @@ class OppoClient:
   The command reference can be found at: http://download.oppodigital.com/UDP203/OPPO_UDP-20X_RS-232_and_IP_Control_Protocol.pdf
   
   Must supply the host/IP address and port (default 23).
+
+  The pipeline depth controls how many commands may be outstanding at once.  The
+  default of 1 waits for each response before sending the next command, higher 
+  values write commands back-to-back and match responses by their response code.
+  Commands waiting to be sent are queued by priority, remote and set commands are sent
+  ahead of queries.  Identical queries that are queued or waiting for a response at the 
+  same time are sent once, and share the response.
+
+  If a coalesce window (in seconds) is supplied, bursts of device state updated/changed
+  events within the window are merged into a single event.
+
+  If a response cache is supplied, idempotent queries are answered from the cache while 
+  the cached response is fresh.
+
+  The verbose mode and playback extrapolation options are passed on to the device.
+
+  Commands sent together (i.e. when pipelining) are written to the connection in batches 
+  of at most max_write_batch commands, to keep within the device's input buffer.
+
+  If a disc cache is supplied, the metadata of known discs is populated from the cache 
+  rather than queried from the device.
+
+  If the connection drops, reconnects back off exponentially (with jitter) and are retried 
+  indefinitely unless max_retries is given.
+
+  If metrics are supplied, command latencies, timeouts, received frames, parse and event 
+  dispatch times and the command queue depth are recorded.
   """
-  def __init__(self, host_name: str, port_number: int = 23, mac_address: str = None, event_loop: Optional[asyncio.AbstractEventLoop] = None):
+  def __init__(self, host_name: str, port_number: int = 23, mac_address: str = None, event_loop: Optional[asyncio.AbstractEventLoop] = None, pipeline_depth: int = DEFAULT_PIPELINE_DEPTH, coalesce_window: Optional[float] = None, response_cache: Optional[OppoResponseCache] = None, verbose_mode: SetVerboseMode = SetVerboseMode.VERBOSE, extrapolate_playback: bool = False, max_write_batch: int = DEFAULT_MAX_WRITE_BATCH, max_retries: Optional[int] = None, disc_cache: Optional[OppoDiscCache] = None, metrics: Optional[OppoMetrics] = None):
     self._host_name = host_name
     self._port_number = port_number
     self._loop = event_loop
     self._disconnect_requested = asyncio.Event()
-    self._command_response_received = asyncio.Event()
-    self._command_lock = asyncio.Lock()
+    self._pipeline = OppoCommandPipeline()
+    self._pipeline_depth = max(1, pipeline_depth)
+    self._command_queue = OppoCommandQueue(self._pipeline_depth)
+    self._coalesce_window = coalesce_window
+    self._coalescer = None  # type: Optional[OppoEventCoalescer]
+    self._response_cache = response_cache
+    self._disc_cache = disc_cache
+    self._metrics = metrics
+    self._shared_queries = {}  # type: Dict[Tuple[type, bytes], asyncio.Task]
+    self._max_write_batch = max_write_batch
     self._command_timeouts = 0
+    self._max_retries = max_retries
     self._retries_since_last_connect = -1
     self._has_successful_connect = False   
     self._state = OppoClientState.INITIALIZING
-    self._reader = None
-    self._writer = None
+    self._protocol = None  # type: Optional[OppoProtocol]
     self._initialize_event_handlers()
-    self._device = OppoDevice(self, mac_address)
+    self._device = OppoDevice(self, mac_address, verbose_mode, extrapolate_playback)
 
   @property
   def state(self) -> OppoClientState:
     """Gets the state of the client"""
     return self._state
 
+  @property
+  def host_name(self) -> str:
+    """Gets the host name/IP address of the device"""
+    return self._host_name
+
+  @property
+  def port_number(self) -> int:
+    """Gets the port number of the device"""
+    return self._port_number
+
   @property
   def loop(self) -> asyncio.AbstractEventLoop:
     """Gets the asyncio event loop"""
@@ -64,14 +117,74 @@ def available(self) -> bool:
     """Indicates whether the client is available for sending/receiving commands"""
     return self._state == OppoClientState.CONNECTED
 
+  @property
+  def pipeline_depth(self) -> int:
+    """Gets the maximum number of outstanding commands"""
+    return self._pipeline_depth
+
+  @property
+  def queued_commands(self) -> int:
+    """Gets the number of commands waiting to be sent"""
+    return len(self._command_queue)
+
   @property
   def event_handlers(self) -> Dict[str, List[Callable]]:
     return self._event_handlers
 
+  @property
+  def response_cache(self) -> Optional[OppoResponseCache]:
+    """Gets the response cache (None if responses are not cached)"""
+    return self._response_cache
+
+  @property
+  def disc_cache(self) -> Optional[OppoDiscCache]:
+    """Gets the disc metadata cache (None if disc metadata is not cached)"""
+    return self._disc_cache
+
+  @property
+  def metrics(self) -> Optional[OppoMetrics]:
+    """Gets the metrics (None if metrics are not collected)"""
+    return self._metrics
+
+  @property
+  def coalescer(self) -> Optional[OppoEventCoalescer]:
+    """Gets the event coalescer (None if events are not coalesced)"""
+    if self._coalescer is None and self._coalesce_window:
+      self._coalescer = OppoEventCoalescer(self._coalesce_window, self._dispatch_event, self.loop)
+    return self._coalescer
+
   async def async_event(self, event: str, *args, **kwargs):
     """Trigger event callbacks sequentially"""
-    for cb in self.event_handlers[event]:
-      asyncio.ensure_future(cb(*args, **kwargs), loop=self.loop)
+    self.fire_event(event, *args, **kwargs)
+
+  def fire_event(self, event: str, *args, **kwargs):
+    """
+    Trigger event callbacks sequentially.  Plain callables are run inline, coroutine
+    callbacks are scheduled as tasks.
+    """
+    coalescer = self.coalescer
+    if coalescer is not None and not kwargs and coalescer.coalesce(event, *args):
+      return
+    self._dispatch_event(event, *args, **kwargs)
+
+  def _dispatch_event(self, event: str, *args, **kwargs):
+    """Runs/schedules the event callbacks (internal)"""
+    tracer = tracing.tracer
+    if tracer is None:
+      self._run_event_handlers(event, args, kwargs)
+      return
+    with tracer.start_as_current_span(tracing.SPAN_DISPATCH, attributes={ tracing.ATTR_EVENT: event }):
+      self._run_event_handlers(event, args, kwargs)
+
+  def _run_event_handlers(self, event: str, args: tuple, kwargs: dict):
+    """Runs the event callbacks, timing them if metrics are collected (internal)"""
+    metrics = self._metrics
+    if metrics is None:
+      run_event_handlers(self.event_handlers[event], event, args, kwargs, self.loop)
+      return
+    start = metrics.clock()
+    run_event_handlers(self.event_handlers[event], event, args, kwargs, self.loop)
+    metrics.observe_dispatch(event, metrics.clock() - start)
 
   def add_event_handler(self, event: str, callback: Callable, disposable: bool = False):
     """Adds an event handler to an event"""
@@ -82,9 +195,9 @@ def add_event_handler(self, event: str, callback: Callable, disposable: bool = F
   def remove_event_handler(self, event: str, callback: Callable):
     """Removes an event handler for an event"""
     try:
-      self.event_handlers[event].remove(callable)
+      self.event_handlers[event].remove(callback)
     except:
-      _LOGGER.warn(f"could not remove event handler {event}-{callable}")
+      _LOGGER.warn(f"could not remove event handler {event}-{callback}")
 
   def clear_event_handlers(self):
     """Clears all non-internal event handlers"""
@@ -97,8 +210,8 @@ async def async_run_client(self):
 
     _LOGGER.info('Starting Oppo client')
     while not self._disconnect_requested.is_set():
-      if self._retries_since_last_connect > MAX_RETRIES:
-        _LOGGER.debug(f'Tried auto-reconnecting {MAX_RETRIES} times, giving up.')
+      if self._max_retries is not None and self._retries_since_last_connect > self._max_retries:
+        _LOGGER.debug(f'Tried auto-reconnecting {self._max_retries} times, giving up.')
         break
       try:
         await self._async_run_client()
@@ -112,13 +225,23 @@ async def async_run_client(self):
         if not self._disconnect_requested.is_set():
           await self._set_state(OppoClientState.DROPPED)
           await self._set_state(OppoClientState.WAITING)
-          _LOGGER.debug('Waiting before reconnecting')
-          await asyncio.sleep(RETRY_INTERVAL)
+          delay = self._retry_delay()
+          _LOGGER.debug(f'Waiting {delay:.1f}s before reconnecting')
+          try:
+            await asyncio.wait_for(self._disconnect_requested.wait(), delay)
+          except asyncio.TimeoutError:
+            pass
         self._retries_since_last_connect += 1
 
     #initiate the disconnection            
     await self.disconnect()
 
+  def _retry_delay(self) -> float:
+    """Gets the delay before the next reconnect, backing off exponentially with jitter"""
+    attempt = max(0, self._retries_since_last_connect + 1)
+    delay = min(MAX_RETRY_INTERVAL, RETRY_INTERVAL * 2 ** min(attempt, 16))
+    return delay * random.uniform(1 - RETRY_JITTER, 1)
+
   async def disconnect(self):
     """Disconnect and cleanup."""
     if not self._disconnect_requested.is_set():
@@ -126,6 +249,8 @@ async def disconnect(self):
       await self._set_state(OppoClientState.DISCONNECTING)         
       self._disconnect_requested.set()
       await self._disconnect()
+      if self._coalescer is not None:
+        self._coalescer.flush()
       await self._set_state(OppoClientState.DISCONNECTED)
 
   async def test_connection(self) -> bool:
@@ -147,24 +272,42 @@ async def test_connection(self) -> bool:
     
     return True
 
-  async def async_send_command(self, command: OppoCommand):
-    """Sends a command to the client"""
+  def send_command(self, command: OppoCommand) -> 'asyncio.Future[OppoResponse]':
+    """
+    Sends a command to the client, returning a future that resolves to the response matched 
+    to the command.  The future raises OppoCommandTimeoutError if the device does not respond 
+    in time, or OppoCommandError if the device reports an error.
+    """
+    return self.loop.create_task(self._async_execute_command(command))
+
+  def cancel_queued_commands(self, predicate: Optional[Callable[[OppoCommand], bool]] = None) -> int:
+    """
+    Cancels the queries waiting to be sent (or the commands matching the predicate), their 
+    futures raise OppoCommandCancelledError.  Returns the number of commands cancelled.
+    """
+    if predicate is None:
+      predicate = lambda command: isinstance(command, OppoQueryCommand)
+    cancelled = self._command_queue.cancel(predicate)
+    if cancelled:
+      _LOGGER.debug(f"Cancelled {cancelled} queued commands.")
+    return cancelled
+
+  async def async_send_command(self, command: OppoCommand) -> Optional[OppoResponse]:
+    """Sends a command to the client, returns the response or None if the command failed/timed out"""
     try:
-      await self._send_command(command)
-      self._command_timeouts = 0
-    except asyncio.exceptions.TimeoutError:
+      return await self._async_execute_command(command)
+    except OppoCommandTimeoutError:
       _LOGGER.debug("Timeout waiting for command response.")
-      self._command_timeouts += 1
-      if self._command_timeouts > MAX_TIMEOUTS:
-        _LOGGER.warn("Multiple timeouts while waiting for command response, will disconnect and retry.")    
-        asyncio.ensure_future(self.disconnect())
+    except OppoCommandError as err:
+      _LOGGER.debug(f"{err}")
+    return None
 
   async def _set_state(self, new_state: OppoClientState) -> bool:
     """Indicate that the state changed and raise an event"""
     if self._state != new_state:
       old_state = self._state
       self._state = new_state
-      await self.async_event(EVENT_STATE_CHANGED, old_state, new_state)
+      self.fire_event(EVENT_STATE_CHANGED, old_state, new_state)
       return True
     return False
 
@@ -175,20 +318,22 @@ def _initialize_event_handlers(self):
     self.add_event_handler(EVENT_COMMAND_RESPONSE, self._on_command_response)
     pass
 
-  async def _on_state_change(self, old_state: OppoClientState, new_state: OppoClientState):
+  def _on_state_change(self, old_state: OppoClientState, new_state: OppoClientState):
     """Handles the on state change event"""
     _LOGGER.debug(f'Client changed state: {old_state} to {new_state}')
 
+    #the device may have changed while we weren't connected
+    if new_state == OppoClientState.CONNECTED and self._response_cache is not None:
+      self._response_cache.invalidate()
+
     if new_state == OppoClientState.CONNECTED:
-      await self.async_event(EVENT_CONNECTED, self)
+      self.fire_event(EVENT_CONNECTED, self)
     if new_state == OppoClientState.DISCONNECTED:
-      await self.async_event(EVENT_DISCONNECTED, self)
+      self.fire_event(EVENT_DISCONNECTED, self)
 
-  async def _on_command_response(self, response: OppoResponse):
+  def _on_command_response(self, response: OppoResponse):
     """Handles a command response received event"""
     _LOGGER.debug(f'Received command response: {response}')
-    self._current_command = None
-    self._command_response_received.set()
 
   async def _set_connected(self):
     """Marks the client as connected"""
@@ -200,75 +345,167 @@ async def _async_run_client(self):
     """Run the client (internal)."""
     try:
       await self._set_state(OppoClientState.CONNECTING)
-      reader, writer = await asyncio.open_connection(self._host_name, self._port_number)
-      self._reader = reader
-      self._writer = writer
+      _, protocol = await self.loop.create_connection(
+        lambda: OppoProtocol(self._on_frame_received, self.loop, self._max_write_batch), 
+        self._host_name, 
+        self._port_number
+      )
+      self._protocol = protocol
 
       await self._set_connected()
       self._initialize_device()
+
+      #frames are handled as they arrive, so just wait until the connection 
+      #drops or we're asked to disconnect
+      disconnect_requested = asyncio.ensure_future(self._disconnect_requested.wait())
+      connection_lost = asyncio.ensure_future(protocol.wait_closed())
       try:
-        async for message in CancellableAsyncIterator(OppoStreamIterator(reader), self._disconnect_requested):
-          asyncio.create_task(self._process_message(message))
-      except asyncio.exceptions.IncompleteReadError:
-        pass
-      except RuntimeError as err:
-        #do nothing if it's a StopAsyncIteration, we just stopped the iteration
-        #as part of the disconnect
-        if not isinstance(err.__cause__, StopAsyncIteration):
-          raise
+        await asyncio.wait([disconnect_requested, connection_lost], return_when=asyncio.FIRST_COMPLETED)
+      finally:
+        disconnect_requested.cancel()
+        connection_lost.cancel()
     finally:
       await self._disconnect()    
 
   async def _disconnect(self) -> None:
     """Disconnects the client (internal)"""
-    if self._writer:
-      self._writer.close()
-      await self._writer.wait_closed()
+    #queued commands can't be sent any more
+    self._command_queue.cancel()
+    self._pipeline.clear()
+    protocol = self._protocol
+    self._protocol = None
+    if protocol and protocol.transport:
+      protocol.transport.close()
+      await protocol.wait_closed()
+
+  def _on_frame_received(self, frame: bytes):
+    """Handles a complete frame received from the Oppo server"""
+    try:
+      self._process_message(frame)
+    except:
+      _LOGGER.warning(f"Error processing message {frame}.", exc_info=True)
 
   def _initialize_device(self):
     """Initializes the device (gets power status, and triggers a future initialization)"""
     async def _async_initialize_device():   
-      #query the power status to try to determine state
-      await self.async_send_command(OppoQueryCommand(OppoQueryCode.QPW))
+      #determine the device state (or verify the restored state)
+      await self._device.async_initialize()
       #indicate we're ready to go
-      await self.async_event(EVENT_READY, self)
+      self.fire_event(EVENT_READY, self)
     
     asyncio.ensure_future(_async_initialize_device())
 
-  async def _send_command(self, command: OppoCommand):
+  async def _async_execute_command(self, command: OppoCommand) -> OppoResponse:
+    """Sends a command and translates the outcome into a response or typed error (internal)"""
+    if self._response_cache is not None:
+      response = self._response_cache.get(command)
+      if response is not None:
+        _LOGGER.debug(f'Using cached response for command: {command}')
+        return response
+
+    if not isinstance(command, OppoQueryCommand):
+      return await self._async_execute_uncached(command)
+
+    #queries have no side effects, so callers of the same query share one round trip
+    key = (command.__class__, command.encode())
+    shared = self._shared_queries.get(key)
+    if shared is None:
+      shared = self._shared_queries[key] = self.loop.create_task(self._async_execute_uncached(command))
+      shared.add_done_callback(partial(self._on_shared_query_done, key))
+    else:
+      _LOGGER.debug(f'Sharing the response to a queued command: {command}')
+    #one caller giving up doesn't cancel the query for the others
+    return await asyncio.shield(shared)
+
+  def _on_shared_query_done(self, key: Tuple[type, bytes], task: asyncio.Task):
+    """Removes a completed shared query (internal)"""
+    if self._shared_queries.get(key) is task:
+      del self._shared_queries[key]
+    #the callers may all have given up, so mark any error as retrieved
+    if not task.cancelled():
+      task.exception()
+
+  async def _async_execute_uncached(self, command: OppoCommand) -> OppoResponse:
+    """Sends a command, raising a typed error if it fails (internal)"""
+    try:
+      response = await self._send_command(command)
+      self._command_timeouts = 0
+    except asyncio.exceptions.TimeoutError:
+      self._command_timeouts += 1
+      if self._metrics is not None:
+        self._metrics.record_timeout(command.code.value)
+      if self._command_timeouts > MAX_TIMEOUTS:
+        _LOGGER.warn("Multiple timeouts while waiting for command response, will disconnect and retry.")    
+        asyncio.ensure_future(self.disconnect())
+      raise OppoCommandTimeoutError(command.code, COMMAND_TIMEOUT) from None
+
+    if response.result == ResultCode.ERROR:
+      raise OppoCommandError("The device returned an error", command.code, response.raw_value)
+    if self._response_cache is not None:
+      self._response_cache.put(command, response)
+    return response
+
+  async def _send_command(self, command: OppoCommand) -> OppoResponse:
     """Sends a command to the client (internal)"""
     _LOGGER.debug(f'Sending command: {command}')
-    async with self._command_lock:
-      await self.async_event(EVENT_COMMAND_SENDING, command)
-      self._current_command = command.expected_response_codes
-      self._command_response_received.clear()
-      if self._writer:
+    tracer = tracing.tracer
+    if tracer is None:
+      return await self._async_exchange_command(command)
+    attributes = { tracing.ATTR_CODE: command.code.value, tracing.ATTR_HOST: self._host_name }
+    with tracer.start_as_current_span(tracing.SPAN_SEND_COMMAND, attributes=attributes):
+      return await self._async_exchange_command(command)
+
+  async def _async_exchange_command(self, command: OppoCommand) -> OppoResponse:
+    """Writes a command and waits for the matching response (internal)"""
+    metrics = self._metrics
+    if metrics is not None:
+      metrics.command_queued()
+    try:
+      await self._command_queue.acquire(command)
+      try:
+        self.fire_event(EVENT_COMMAND_SENDING, command)
+        #register before writing so that a fast response can always be matched
+        pending = self._pipeline.register(command, self.loop.create_future())
         try:
-          #write the command to the stream
-          self._writer.write(command.encode())  
-          await self._writer.drain()
-          await self.async_event(EVENT_COMMAND_SENT, command)
-        except ConnectionResetError:
-          _LOGGER.info("Could not send command, connection reset.")
-      await asyncio.wait_for(self._command_response_received.wait(), COMMAND_TIMEOUT)
-
-  async def _process_message(self, message: bytes) -> OppoResponse:
+          sent_at = metrics.clock() if metrics is not None else 0
+          if self._protocol and not self._protocol.is_closed:
+            try:
+              #queue the command, commands sent together are written together
+              self._protocol.write(command.encode())
+              await self._protocol.drain()
+              self.fire_event(EVENT_COMMAND_SENT, command)
+            except ConnectionResetError:
+              _LOGGER.info("Could not send command, connection reset.")
+          response = await asyncio.wait_for(pending.future, COMMAND_TIMEOUT)
+          if metrics is not None:
+            metrics.observe_command(command.code.value, metrics.clock() - sent_at)
+          return response
+        finally:
+          self._pipeline.unregister(pending)
+      finally:
+        self._command_queue.release()
+    finally:
+      if metrics is not None:
+        metrics.command_done()
+
+  def _process_message(self, message: bytes) -> OppoResponse:
     """Processes a message received from the Oppo server"""
     _LOGGER.debug(f'Received message: {message}')
-    response = get_response(message)
+    metrics = self._metrics
+    if metrics is None:
+      response = get_response(message)
+    else:
+      start = metrics.clock()
+      response = get_response(message)
+      metrics.observe_frame(getattr(response.code, "value", response.code) or "", metrics.clock() - start)
     _LOGGER.debug(f'Parsed message: {response}')
-    await self.async_event(EVENT_MESSAGE_RECEIVED, response)
-
-    #if we're not in the right mode, we just need to assume that everything is good
-    if response.raw_value[:3] in [b"@OK",b"@ER"] and self._current_command is not None:
-      await self.async_event(EVENT_COMMAND_RESPONSE, response)
-    #if this event paired to the current command, we need to indicate we've received
-    #the response so that we can initiate more commands
-    elif (
-      self._current_command is not None and 
-      isinstance(response.code, OppoCode) and 
-      response.code.value in self._current_command
-    ):
-      await self.async_event(EVENT_COMMAND_RESPONSE, response)
+    if self._response_cache is not None:
+      self._response_cache.on_message_received(response)
+    self.fire_event(EVENT_MESSAGE_RECEIVED, response)
+
+    #if this message answers an outstanding command, release it so that
+    #more commands can be sent
+    if self._pipeline.match(response) is not None:
+      self.fire_event(EVENT_COMMAND_RESPONSE, response)
 
     return response
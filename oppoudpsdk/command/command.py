@@ -1,14 +1,43 @@
-from typing import List
+from typing import Dict, List, Optional, Tuple
 from ..codes import *
 from dataclasses import dataclass
 
+class OppoCommandMeta(type):
+  """
+  Metaclass for commands that interns the instances of internable command classes, so that
+  commands that can only ever be encoded one way (e.g. a query or a remote key) are created 
+  and encoded once and then shared.
+  """
+  _interned = {}  # type: Dict[Tuple, OppoCommand]
+
+  def __call__(cls, *args, **kwargs):
+    if not cls._internable or kwargs:
+      return super().__call__(*args, **kwargs)
+
+    key = (cls,) + args
+    try:
+      command = OppoCommandMeta._interned.get(key)
+    except TypeError:
+      #unhashable arguments (i.e. parameter lists), so it can't be shared
+      return super().__call__(*args)
+
+    if command is None:
+      command = super().__call__(*args)
+      command.encode()
+      OppoCommandMeta._interned[key] = command
+    return command
+
 @dataclass(repr=True, eq=True)
-class OppoCommand:
+class OppoCommand(metaclass=OppoCommandMeta):
   """Represents a command to an OppoDevice"""
   code: OppoCodeType
   _parameters: List[str]
   _response_codes: List[str]
 
+  #whether instances are shared between callers with the same arguments (they must not be modified)
+  _internable = False
+  _encoded = None  # type: Optional[bytes]
+
   def __init__(self, code: OppoCodeType, parameters: List[str] = None, response_codes: List[str] = None):
     if parameters is None:
       parameters = []
@@ -19,11 +48,15 @@ def __init__(self, code: OppoCodeType, parameters: List[str] = None, response_co
     self._parameters = parameters
     self._response_codes = response_codes + [self.code.value]
 
-  def encode(self):
-    params = ""
-    if len(self._parameters) > 0:
-      params = " " + " ".join(list(map(str, self._parameters)))
-    return f"#{self.code.value}{params}\r".encode()
+  def encode(self) -> bytes:
+    """Encodes the command, the frame is built once and reused for later sends"""
+    encoded = self._encoded
+    if encoded is None:
+      params = ""
+      if len(self._parameters) > 0:
+        params = " " + " ".join(list(map(str, self._parameters)))
+      encoded = self._encoded = f"#{self.code.value}{params}\r".encode()
+    return encoded
 
   @property
   def expected_response_codes(self):
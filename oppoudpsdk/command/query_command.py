@@ -3,6 +3,8 @@
 from .command import OppoCommand
 
 class OppoQueryCommand(OppoCommand):
+  _internable = True
+
   def __init__(self, code: OppoQueryCodeType, parameters: List[str] = [], response_codes: List[str] = []):      
       super().__init__(code, parameters, response_codes)
 
@@ -12,10 +14,22 @@ def _translate(self, code: OppoQueryCodeType):
       return OppoCode(code.value)
 
 class OppoQueryCdCommand(OppoQueryCommand):
+  _internable = True
+
   def __init__(self):
       super().__init__(OppoQueryCode.QCD, [], ["QC2"] )
 
 class OppoQueryDirectoryCommand(OppoQueryCommand):
+  _internable = False
+
   def __init__(self, item: int):
       super().__init__(OppoQueryCode.QDR, [item])
-      
\ No newline at end of file
+
+def _prebuild():
+  """Builds the query commands up front, they're sent on every refresh"""
+  for code in OppoQueryCode:
+    if code != OppoQueryCode.QDR:
+      OppoQueryCommand(code)
+  OppoQueryCdCommand()
+
+_prebuild()
@@ -2,10 +2,19 @@
 from .command import OppoCommand
 
 class OppoRemoteCommand(OppoCommand):
+  _internable = True
+
   def __init__(self, code: OppoRemoteCodeType):      
       super().__init__(code)
 
   def _translate(self, code: OppoRemoteCodeType):
       if isinstance(code, str):
         return OppoCode(OppoRemoteCode(code).value)
-      return OppoCode(code.value)
\ No newline at end of file
+      return OppoCode(code.value)
+
+def _prebuild():
+  """Builds the remote commands up front"""
+  for code in OppoRemoteCode:
+    OppoRemoteCommand(code)
+
+_prebuild()
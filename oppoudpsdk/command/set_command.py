@@ -15,16 +15,22 @@ def _translate(self, code: OppoSetCodeType):
     return OppoCode(code.value)
 
 class OppoSetVerboseModeCommand(OppoSetCommand):
+  _internable = True
+
   def __init__(self, mode: SetVerboseMode):
     super().__init__(OppoSetCode.SVM)
     self._parameters.append(mode)
 
 class OppoSetHdmiModeCommand(OppoSetCommand):
+  _internable = True
+
   def __init__(self, mode: SetHdmiMode):
     super().__init__(OppoSetCode.SHD)
     self._parameters.append(mode)
 
 class OppoSetZoomModeCommand(OppoSetCommand):
+  _internable = True
+
   def __init__(self, mode: SetZoomMode):
     super().__init__(OppoSetCode.SZM)
     self._parameters.append(mode)
@@ -39,6 +45,8 @@ def __init__(self, level: VolumeLevelType):
       self._parameters.append(level)
 
 class OppoSetRepeatModeCommand(OppoSetCommand):
+  _internable = True
+
   def __init__(self, mode: SetRepeatMode):
     super().__init__(OppoSetCode.SRP)
     self._parameters.append(mode)
@@ -54,47 +62,65 @@ def __init__(self, shift: int):
     self._parameters.append(str(clamp(shift,0,5)))
 
 class OppoSetTimeCodeModeCommand(OppoSetCommand):
+  _internable = True
+
   def __init__(self, mode: SetTimeCodeMode):
     super().__init__(OppoSetCode.STC)
     self._parameters.append(mode)
 
 class OppoSetHdrModeCommand(OppoSetCommand):
+  _internable = True
+
   def __init__(self, mode: SetHdrMode):
     super().__init__(OppoSetCode.SHR)
     self._parameters.append(mode)
 
 class OppoSetInputSourceCommand(OppoSetCommand):
+  _internable = True
+
   def __init__(self, source: SetInputSource):
     super().__init__(OppoSetCode.SIS)
     self._parameters.append(source)
 
 class OppoSetScreensaverCommand(OppoSetCommand):
+  _internable = True
+
   def __init__(self, mode: SetScreenSaverMode):
     super().__init__(OppoSetCode.SSA)
     self._parameters.append(mode)
 
 class OppoSetAppModeCommand(OppoSetCommand):
+  _internable = True
+
   def __init__(self, mode: SetAppMode):
     super().__init__(OppoSetCode.APP)
     self._parameters.append(mode)
 
 class OppoSetSacdPriorityCommand(OppoSetCommand):
+  _internable = True
+
   def __init__(self, mode: SetSacdPriority):
     super().__init__(OppoSetCode.SSD)
     self._parameters.append(mode)
 
 class OppoSetSacdOutputModeCommand(OppoSetCommand):
+  _internable = True
+
   def __init__(self, mode: SetSacdOutputMode):
     super().__init__(OppoSetCode.SDP)
     self._parameters.append(mode)
 
 class OppoSetFwdModeCommand(OppoSetCommand):
+  _internable = True
+
   def __init__(self, mode: Optional[SetSpeedMode]):
     super().__init__(OppoSetCode.FWD)
     if mode is not None:
       self._parameters.append(mode)
 
 class OppoSetRevModeCommand(OppoSetCommand):
+  _internable = True
+
   def __init__(self, mode: Optional[SetSpeedMode]):
     super().__init__(OppoSetCode.REV)
     if mode is not None:
@@ -119,3 +145,10 @@ class OppoSetTitlePositionCommand(OppoSetCommand):
   def __init__(self, position: timedelta):
     super().__init__(OppoSetCode.SRH)
     self._parameters.append("T " + strfdelta(position,"{H:02}:{M:02}:{S:02}"))
+
+def _prebuild():
+  """Builds the verbose mode commands up front, the mode is toggled around every refresh"""
+  for mode in SetVerboseMode:
+    OppoSetVerboseModeCommand(mode)
+
+_prebuild()
@@ -1,6 +1,23 @@
-MAX_RETRIES = 3
+#reconnect delays back off exponentially from the retry interval up to the max, less up to the jitter fraction
 RETRY_INTERVAL = 2
+MAX_RETRY_INTERVAL = 60
+RETRY_JITTER = 0.5
+#seconds a state snapshot taken when the connection drops can be restored for
+SNAPSHOT_MAX_AGE = 300
 MAX_TIMEOUTS = 5
+#number of commands that may be outstanding at once (1 = no pipelining)
+DEFAULT_PIPELINE_DEPTH = 1
+#seconds between scheduled refreshes of pooled devices
+DEFAULT_REFRESH_INTERVAL = 60
+#number of pooled devices that may be refreshed at once
+DEFAULT_MAX_CONCURRENT_REFRESHES = 8
+#adaptive refresh intervals (in seconds) for playing and idle devices
+DEFAULT_PLAYING_REFRESH_INTERVAL = 5
+DEFAULT_MAX_PLAYING_REFRESH_INTERVAL = 60
+DEFAULT_IDLE_REFRESH_INTERVAL = 300
+#seconds the device position may be from the extrapolated position and still be in step with it
+#(time updates are in whole seconds), used when re-anchoring the playback clock and adapting refreshes
+PLAYBACK_DRIFT_TOLERANCE = 1.5
 
 #occurs when the client is connected
 EVENT_CONNECTED = "connected"
@@ -24,6 +41,8 @@
 EVENT_DEVICE_STATE_UPDATING = "device_state_updating"
 #occurs after the device state has been updated
 EVENT_DEVICE_STATE_UPDATED = "device_state_updated"
+#occurs after the device state has changed, with the changes as {attribute: (old, new)}
+EVENT_DEVICE_STATE_CHANGED = "device_state_changed"
 #occurs when the disc id changes
 EVENT_DISC_ID_CHANGED = "disc_id_changed"
 
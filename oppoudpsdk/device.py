@@ -1,70 +1,262 @@
 import logging
 import asyncio
-from typing import Optional, TYPE_CHECKING
-from dataclasses import dataclass
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Iterable, Optional, TYPE_CHECKING
 from datetime import datetime, timedelta
 from .const import *
 from .command import *
 from .response import *
 from .codes import *
-from .helpers import clamp
+from .helpers import SingleFlight, clamp
+from .states import OppoClientState
+from . import tracing
 
 if TYPE_CHECKING:
     from .client import OppoClient
 
 _LOGGER = logging.getLogger(__name__)
 
-@dataclass(repr=True, eq=True)
+def _query_command(code: OppoQueryCode) -> OppoQueryCommand:
+  """Gets the command used to query a code"""
+  if code == OppoQueryCode.QCD:
+    return OppoQueryCdCommand()
+  return OppoQueryCommand(code)
+
+#playback attributes and their defaults (all immutable, so they can be shared)
+PLAYBACK_ATTRIBUTE_DEFAULTS = (
+  (ATTR_PLAYBACK_TRACK, 0),
+  (ATTR_PLAYBACK_TRACK_TOTAL, 0),
+  (ATTR_PLAYBACK_CHAPTER, 0),
+  (ATTR_PLAYBACK_CHAPTER_TOTAL, 0),
+  (ATTR_PLAYBACK_TRACK_ELAPSED_TIME, timedelta(seconds=0)),
+  (ATTR_PLAYBACK_TRACK_REMAINING_TIME, timedelta(seconds=0)),
+  (ATTR_PLAYBACK_TRACK_DURATION, timedelta(seconds=0)),
+  (ATTR_PLAYBACK_CHAPTER_ELAPSED_TIME, timedelta(seconds=0)),
+  (ATTR_PLAYBACK_CHAPTER_REMAINING_TIME, timedelta(seconds=0)),
+  (ATTR_PLAYBACK_CHAPTER_DURATION, timedelta(seconds=0)),
+  (ATTR_PLAYBACK_TOTAL_ELAPSED_TIME, timedelta(seconds=0)),
+  (ATTR_PLAYBACK_TOTAL_REMAINING_TIME, timedelta(seconds=0)),
+  (ATTR_PLAYBACK_TOTAL_DURATION, timedelta(seconds=0)),
+  (ATTR_PLAYBACK_AUDIO_TYPE, ""),
+  (ATTR_PLAYBACK_SUBTITLE_TYPE, ""),
+  (ATTR_PLAYBACK_REPEAT_MODE, RepeatMode.OFF),
+  (ATTR_PLAYBACK_VIDEO_3D_STATUS, Video3dStatus.UNKNOWN),
+  (ATTR_PLAYBACK_VIDEO_HDR_STATUS, VideoHdrStatus.UNKNOWN),
+  (ATTR_PLAYBACK_ASPECT_RATIO, ""),
+  (ATTR_PLAYBACK_MEDIA_FILE_FORMAT, ""),
+  (ATTR_PLAYBACK_MEDIA_FILE_NAME, ""),
+  (ATTR_PLAYBACK_TRACK_NAME, ""),
+  (ATTR_PLAYBACK_TRACK_ALBUM, ""),
+  (ATTR_PLAYBACK_TRACK_PERFORMER, ""),
+  (ATTR_PLAYBACK_REV_SPEED, SpeedMode.NORMAL),
+  (ATTR_PLAYBACK_FWD_SPEED, SpeedMode.NORMAL),
+)
+
 class OppoPlaybackStatus:
-  """Playback attributes for the Oppo device"""
-  track: int = 0
-  track_total: int = 0
-  chapter: int = 0
-  chapter_total: int = 0
-  track_elapsed_time: timedelta = timedelta(seconds=0)
-  track_remaining_time: timedelta = timedelta(seconds=0)
-  track_duration: timedelta = timedelta(seconds=0)
-  chapter_elapsed_time: timedelta = timedelta(seconds=0)
-  chapter_remaining_time: timedelta = timedelta(seconds=0)
-  chapter_duration: timedelta = timedelta(seconds=0)
-  total_elapsed_time: timedelta = timedelta(seconds=0)
-  total_remaining_time: timedelta = timedelta(seconds=0)
-  total_duration: timedelta = timedelta(seconds=0)
-  audio_type: str = ""
-  subtitle_type: str = ""
-  repeat_mode: RepeatMode = RepeatMode.OFF
-  video_3d_status: Video3dStatus = Video3dStatus.UNKNOWN
-  video_hdr_status: VideoHdrStatus = VideoHdrStatus.UNKNOWN
-  aspect_ratio: str = ""
-  media_file_format: str = ""
-  media_file_name: str = ""
-  track_name: str = ""
-  track_album: str = ""
-  track_performer: str = "" 
-  rev_speed: SpeedMode = SpeedMode.NORMAL
-  fwd_speed: SpeedMode = SpeedMode.NORMAL
+  """
+  Playback attributes for the Oppo device.  The status is reset in place rather than 
+  replaced, so a device keeps the same instance for its lifetime.
+  """
+  #the playback attributes, plus the loop time the times were last anchored at 
+  #and the rate they advance at since then
+  __slots__ = tuple(name for name, _ in PLAYBACK_ATTRIBUTE_DEFAULTS) + ('anchored_at', 'rate')
+
+  def __init__(self, **kwargs):
+    self.reset()
+    for name, value in kwargs.items():
+      setattr(self, name, value)
+
+  def __repr__(self) -> str:
+    return f"OppoPlaybackStatus({', '.join(f'{name}={getattr(self, name)!r}' for name, _ in PLAYBACK_ATTRIBUTE_DEFAULTS)})"
+
+  def __eq__(self, other) -> bool:
+    if other.__class__ is not self.__class__:
+      return NotImplemented
+    return all(getattr(self, name) == getattr(other, name) for name, _ in PLAYBACK_ATTRIBUTE_DEFAULTS)
+
+  __hash__ = None
+
+  def reset(self, changes: Optional[OppoStateChanges] = None):
+    """Resets the attributes to their defaults, recording the attributes that changed (if given)"""
+    for name, default in PLAYBACK_ATTRIBUTE_DEFAULTS:
+      if changes is not None:
+        record_change(changes, name, getattr(self, name), default)
+      setattr(self, name, default)
+    self.anchored_at = None
+    self.rate = 0.0
+
+  def assign(self, other: 'OppoPlaybackStatus', changes: Optional[OppoStateChanges] = None):
+    """Copies the attributes of another playback status, recording the attributes that changed (if given)"""
+    for name, _ in PLAYBACK_ATTRIBUTE_DEFAULTS:
+      if changes is not None:
+        record_change(changes, name, getattr(self, name), getattr(other, name))
+      setattr(self, name, getattr(other, name))
+    self.anchored_at = other.anchored_at
+    self.rate = other.rate
+
+  def copy(self) -> 'OppoPlaybackStatus':
+    """Gets a copy of the playback status"""
+    status = OppoPlaybackStatus.__new__(OppoPlaybackStatus)
+    for name in self.__slots__:
+      setattr(status, name, getattr(self, name))
+    return status
+
+  def anchor(self, at: float, rate: float):
+    """Anchors the playback times at a loop time, from which they advance at the rate"""
+    self.anchored_at = at
+    self.rate = rate
+
+  def offset_at(self, now: float) -> timedelta:
+    """Gets how far playback has moved since the times were anchored"""
+    if self.anchored_at is None or not self.rate:
+      return timedelta(0)
+    return timedelta(seconds=(now - self.anchored_at) * self.rate)
+
+  def shift(self, offset: timedelta):
+    """Moves the elapsed/remaining times by the offset"""
+    zero = timedelta(0)
+    self.track_elapsed_time = max(zero, self.track_elapsed_time + offset)
+    self.track_remaining_time = max(zero, self.track_remaining_time - offset)
+    self.chapter_elapsed_time = max(zero, self.chapter_elapsed_time + offset)
+    self.chapter_remaining_time = max(zero, self.chapter_remaining_time - offset)
+    self.total_elapsed_time = max(zero, self.total_elapsed_time + offset)
+    self.total_remaining_time = max(zero, self.total_remaining_time - offset)
+
+  def extrapolated(self, now: float) -> 'OppoPlaybackStatus':
+    """Gets a copy of the playback status with the times extrapolated to the loop time"""
+    status = self.copy()
+    status.shift(self.offset_at(now))
+    status.anchored_at = now
+    return status
+
+#attributes moved when the playback clock is extrapolated
+PLAYBACK_TIME_ATTRIBUTES = [
+  ATTR_PLAYBACK_TRACK_ELAPSED_TIME,
+  ATTR_PLAYBACK_TRACK_REMAINING_TIME,
+  ATTR_PLAYBACK_CHAPTER_ELAPSED_TIME,
+  ATTR_PLAYBACK_CHAPTER_REMAINING_TIME,
+  ATTR_PLAYBACK_TOTAL_ELAPSED_TIME,
+  ATTR_PLAYBACK_TOTAL_REMAINING_TIME,
+]
+
+#rate that playback advances at for each speed mode
+_SPEED_RATES = {
+  SpeedMode.SLOW_1_32: 1 / 32,
+  SpeedMode.SLOW_1_16: 1 / 16,
+  SpeedMode.SLOW_1_8: 1 / 8,
+  SpeedMode.SLOW_1_4: 1 / 4,
+  SpeedMode.SLOW_1_2: 1 / 2,
+  SpeedMode.NORMAL: 1,
+  SpeedMode.FAST_2: 2,
+  SpeedMode.FAST_3: 3,
+  SpeedMode.FAST_4: 4,
+  SpeedMode.FAST_5: 5,
+  SpeedMode.STEP: 0,
+}
+
+#device attributes captured when the connection drops (the disc id parts are set 
+#directly, so restoring them doesn't raise a disc id changed event)
+SNAPSHOT_ATTRIBUTES = [
+  ATTR_DEVICE_POWER_STATUS,
+  ATTR_DEVICE_PLAYBACK_STATUS,
+  ATTR_DEVICE_FIRMWARE_VERSION,
+  ATTR_DEVICE_IS_MUTED,
+  ATTR_DEVICE_VOLUME,
+  ATTR_DEVICE_HDMI_MODE,
+  ATTR_DEVICE_SUBTITLE_SHIFT,
+  ATTR_DEVICE_OSD_POSITION,
+  ATTR_DEVICE_INPUT_SOURCE,
+  ATTR_DEVICE_ZOOM_MODE,
+  ATTR_DEVICE_HDR_SETTING,
+  ATTR_DEVICE_DISC_TYPE,
+  "tray_status",
+  ATTR_DEVICE_CDDB_ID_1,
+  "_cddb_id_2",
+  "_cddb_id",
+]
+
+class OppoDeviceSnapshot:
+  """The state of a device, captured when the connection to it was lost"""
+  __slots__ = ('taken_at', 'attributes', 'playback_attributes')
+
+  def __init__(self, device: 'OppoDevice'):
+    self.taken_at = device.clock_time()
+    self.attributes = { name: getattr(device, name) for name in SNAPSHOT_ATTRIBUTES }
+    self.playback_attributes = device.playback_attributes.copy()
+
+  @property
+  def power_status(self) -> PowerStatus:
+    return self.attributes[ATTR_DEVICE_POWER_STATUS]
 
 class OppoDevice:
-  """Represents a low-level Oppo device"""
-  def __init__(self, client: 'OppoClient', mac_address: Optional[str] = None):
+  """
+  Represents a low-level Oppo device.
+
+  The verbose mode controls which updates the device sends, INFO stops the per-second time 
+  updates.  When extrapolating playback, the playback times are advanced locally from the 
+  last anchor and time updates only re-anchor them when the device disagrees.
+  """
+  def __init__(self, client: 'OppoClient', mac_address: Optional[str] = None, verbose_mode: SetVerboseMode = SetVerboseMode.VERBOSE, extrapolate_playback: bool = False):
     self._client = client
     self._mac_address = mac_address
+    self._verbose_mode = verbose_mode
+    self._extrapolate_playback = extrapolate_playback
     self._client.add_event_handler(EVENT_MESSAGE_RECEIVED, self._on_message_received)
     self._client.add_event_handler(EVENT_CONNECTED, self._on_client_connected)
     self._client.add_event_handler(EVENT_DISCONNECTED, self._on_client_disconnected)
+    self._client.add_event_handler(EVENT_STATE_CHANGED, self._on_client_state_changed)
 
     self.power_status = PowerStatus.DISCONNECTED
     self.playback_status = PlayStatus.OFF
     self.firmware_version = ""
+    self._changes = {}  # type: OppoStateChanges
+    self.playback_attributes = OppoPlaybackStatus()
     self._reset_attributes() 
-    self._state_events_enabled = True
-    self._update_lock = asyncio.Lock()
+    self._batch_depth = 0
+    #refreshes are single-flight, requests made during one share a single trailing refresh
+    self._full_refresh = SingleFlight(self._async_full_update)
+    self._media_refresh = SingleFlight(self._async_media_update)
+    self._snapshot = None  # type: Optional[OppoDeviceSnapshot]
+    self._restored = None  # type: Optional[OppoDeviceSnapshot]
 
   @property
   def mac_address(self) -> str:
     """The oppo device's MAC address"""
     return self._mac_address.upper()
 
+  @property
+  def verbose_mode(self) -> SetVerboseMode:
+    """Gets the verbose mode the device is kept in"""
+    return self._verbose_mode
+
+  @property
+  def extrapolate_playback(self) -> bool:
+    """Indicates whether the playback times are extrapolated locally"""
+    return self._extrapolate_playback
+
+  @property
+  def current_playback_attributes(self) -> OppoPlaybackStatus:
+    """Gets the playback attributes with the times extrapolated to now"""
+    if not self._extrapolate_playback:
+      return self.playback_attributes
+    return self.playback_attributes.extrapolated(self.clock_time())
+
+  @property
+  def playback_rate(self) -> float:
+    """Gets the rate the playback position is advancing at (negative in reverse)"""
+    status = self.playback_status
+    if status == PlayStatus.PLAY:
+      return 1.0
+    if status in [PlayStatus.FAST_FORWARD, PlayStatus.SLOW_FORWARD]:
+      return _SPEED_RATES.get(self.playback_attributes.fwd_speed, 1.0)
+    if status in [PlayStatus.FAST_REVERSE, PlayStatus.SLOW_REVERSE]:
+      return -_SPEED_RATES.get(self.playback_attributes.rev_speed, 1.0)
+    return 0.0
+
+  def clock_time(self) -> float:
+    """Gets the current time of the clock the playback times are anchored to (the event loop's)"""
+    return self._client.loop.time()
+
   @property
   def is_playing(self) -> bool:
     """Indicates whether the device is playing"""
@@ -91,84 +283,163 @@ def cddb_id_2(self, value: str):
     self._cddb_id_2 = value
     if self.cddb_id_1 + self._cddb_id_2 != self._cddb_id:
       #set the full id
+      record_change(self._changes, ATTR_DEVICE_CDDB_ID, self._cddb_id, self.cddb_id_1 + self._cddb_id_2)
       self._cddb_id = self.cddb_id_1 + self._cddb_id_2
-      #call the async event to indicate the change
-      self._client.loop.create_task(self._client.async_event(EVENT_DISC_ID_CHANGED, self))
+      #raise the event to indicate the change
+      self._client.fire_event(EVENT_DISC_ID_CHANGED, self)
 
   @property
   def is_updating(self) -> bool:
     """Indicates whether we are currently updating the state"""
-    return not self._state_events_enabled
+    return self._batch_depth > 0
+
+  async def async_initialize(self):
+    """
+    Initializes the device once connected.  If the state was restored from a snapshot (i.e. 
+    after a dropped connection) it's verified, otherwise the power status is queried.
+    """
+    restored, self._restored = self._restored, None
+    if restored is None:
+      #query the power status to try to determine state
+      await self._client.async_send_command(OppoQueryCommand(OppoQueryCode.QPW))
+    else:
+      await self._async_verify_state(restored)
 
   async def async_request_update(self):
-    """Request the device to send a full state update"""
-    try:
-      #async with self._update_lock:
-        #disable individual state events since we're doing a bunch at once
-      self._state_events_enabled = False
-      await self._client.async_event(EVENT_DEVICE_STATE_UPDATING, self)
-      await self._client.async_send_command(OppoSetVerboseModeCommand(SetVerboseMode.INFO))
-      await self._client.async_send_command(OppoQueryCommand(OppoQueryCode.QVM))
-      await self._client.async_send_command(OppoQueryCommand(OppoQueryCode.QPW))
-      await self._client.async_send_command(OppoQueryCommand(OppoQueryCode.QVR))
-      await self._client.async_send_command(OppoQueryCommand(OppoQueryCode.QVL))
-      await self._client.async_send_command(OppoQueryCommand(OppoQueryCode.QHD))
-      await self._client.async_send_command(OppoQueryCommand(OppoQueryCode.QPL))
-      await self._client.async_send_command(OppoQueryCommand(OppoQueryCode.QDT))
-      await self._client.async_send_command(OppoQueryCommand(OppoQueryCode.QSH))
-      await self._client.async_send_command(OppoQueryCommand(OppoQueryCode.QOP))
-      await self._client.async_send_command(OppoQueryCommand(OppoQueryCode.QZM))
-      await self._client.async_send_command(OppoQueryCommand(OppoQueryCode.QHR))
-      await self._client.async_send_command(OppoQueryCommand(OppoQueryCode.QIS))
-      await self._client.async_send_command(OppoQueryCommand(OppoQueryCode.QAR))
-      await self._client.async_send_command(OppoQueryCdCommand())
-
-      #request media-related updates
-      await self.async_request_media_update(False, True)
-    finally:
-      #re-enable state events and send the updated event
-      self._state_events_enabled = True
-      await self._client.async_send_command(OppoSetVerboseModeCommand(SetVerboseMode.VERBOSE))
-      await self._client.async_event(EVENT_DEVICE_STATE_UPDATED, self)
+    """
+    Request the device to send a full state update.  If a full update is already running, this
+    waits for a single trailing update shared with any other requests made while it runs.
+    """
+    await self._full_refresh.run()
 
   async def async_request_media_update(self, suspend_events: bool = True, full_update: bool = False):
-    try:
-      if self.is_playing:
-        if suspend_events:
-          self._state_events_enabled = False   
-          await self._client.async_event(EVENT_DEVICE_STATE_UPDATING, self)
-          await self._client.async_send_command(OppoSetVerboseModeCommand(SetVerboseMode.INFO))
-
-        await self._client.async_send_command(OppoQueryCommand(OppoQueryCode.QTK))
-        await self._client.async_send_command(OppoQueryCommand(OppoQueryCode.QCH))
-        await self._client.async_send_command(OppoQueryCommand(OppoQueryCode.QTE))
-        await self._client.async_send_command(OppoQueryCommand(OppoQueryCode.QTR))
-        await self._client.async_send_command(OppoQueryCommand(OppoQueryCode.QCE))
-        await self._client.async_send_command(OppoQueryCommand(OppoQueryCode.QCR))
-        await self._client.async_send_command(OppoQueryCommand(OppoQueryCode.QEL))
-        await self._client.async_send_command(OppoQueryCommand(OppoQueryCode.QRE))
-
-        if full_update:
-          await self._client.async_send_command(OppoQueryCommand(OppoQueryCode.QAT))
-          await self._client.async_send_command(OppoQueryCommand(OppoQueryCode.QST))
-          await self._client.async_send_command(OppoQueryCommand(OppoQueryCode.QRP))
-          await self._client.async_send_command(OppoQueryCommand(OppoQueryCode.QFT))
-          await self._client.async_send_command(OppoQueryCommand(OppoQueryCode.QFN))
-          await self._client.async_send_command(OppoQueryCommand(OppoQueryCode.QTN))
-          await self._client.async_send_command(OppoQueryCommand(OppoQueryCode.QTA))
-          await self._client.async_send_command(OppoQueryCommand(OppoQueryCode.QTP))
-          await self._client.async_send_command(OppoQueryCommand(OppoQueryCode.QDS))
-          if self.disc_type in [DiscType.BLURAY, DiscType.UHD_BLURAY]:
-            await self._client.async_send_command(OppoQueryCommand(OppoQueryCode.QHS))   
-          if self.disc_type in [DiscType.BLURAY, DiscType.UHD_BLURAY, DiscType.DVD_VIDEO]:
-            await self._client.async_send_command(OppoQueryCommand(OppoQueryCode.Q3D))
-          
-        self._calculate_duration()
-    finally:
-      if suspend_events:
-        self._state_events_enabled = True
-        await self._client.async_send_command(OppoSetVerboseModeCommand(SetVerboseMode.VERBOSE))
-        await self._client.async_event(EVENT_DEVICE_STATE_UPDATED, self)        
+    """
+    Request the device to send an update of the media (track/chapter/time) state.  Like full
+    updates these are single-flight, and while a full update is running (which includes the
+    media state) this waits for it instead.
+    """
+    if full_update:
+      #the disc metadata is only queried as part of a full update
+      await self.async_request_update()
+    elif self._full_refresh.running:
+      await self._full_refresh.wait()
+    elif not suspend_events:
+      #part of the caller's own batch, which is managing the time updates
+      await self._async_media_update(False)
+    else:
+      await self._media_refresh.run()
+
+  async def _async_full_update(self):
+    with tracing.span(tracing.SPAN_REFRESH, { tracing.ATTR_REFRESH: "full", tracing.ATTR_HOST: self._client.host_name }):
+      async with self._async_batch():
+        try:
+          await self._async_suspend_time_updates()
+          await self._async_query([
+            OppoQueryCode.QVM,
+            OppoQueryCode.QPW,
+            OppoQueryCode.QVR,
+            OppoQueryCode.QVL,
+            OppoQueryCode.QHD,
+            OppoQueryCode.QPL,
+            OppoQueryCode.QDT,
+            OppoQueryCode.QSH,
+            OppoQueryCode.QOP,
+            OppoQueryCode.QZM,
+            OppoQueryCode.QHR,
+            OppoQueryCode.QIS,
+            OppoQueryCode.QAR,
+            OppoQueryCode.QCD
+          ])
+
+          #request media-related updates
+          await self._async_media_update(False, True)
+        finally:
+          await self._async_resume_time_updates()
+
+  async def _async_media_update(self, suspend_events: bool = True, full_update: bool = False):
+    with tracing.span(tracing.SPAN_REFRESH, { tracing.ATTR_REFRESH: "media", tracing.ATTR_HOST: self._client.host_name }):
+      async with self._async_batch():
+        try:
+          if self.is_playing:
+            if suspend_events:
+              await self._async_suspend_time_updates()
+
+            codes = [
+              OppoQueryCode.QTK,
+              OppoQueryCode.QCH,
+              OppoQueryCode.QTE,
+              OppoQueryCode.QTR,
+              OppoQueryCode.QCE,
+              OppoQueryCode.QCR,
+              OppoQueryCode.QEL,
+              OppoQueryCode.QRE
+            ]
+
+            if full_update:
+              codes.append(OppoQueryCode.QRP)
+              disc_codes = [
+                OppoQueryCode.QFT,
+                OppoQueryCode.QDS
+              ]
+              if self.disc_type in [DiscType.BLURAY, DiscType.UHD_BLURAY]:
+                disc_codes.append(OppoQueryCode.QHS)
+              if self.disc_type in [DiscType.BLURAY, DiscType.UHD_BLURAY, DiscType.DVD_VIDEO]:
+                disc_codes.append(OppoQueryCode.Q3D)
+              #these describe what's playing, so they're cached per track
+              track_codes = [
+                OppoQueryCode.QAT,
+                OppoQueryCode.QST,
+                OppoQueryCode.QFN,
+                OppoQueryCode.QTN,
+                OppoQueryCode.QTA,
+                OppoQueryCode.QTP
+              ]
+
+              #known discs are populated from the disc cache, so only query what's missing
+              disc_cache = self._client.disc_cache if self._cddb_id else None
+              disc_frames = disc_cache.get(self._cddb_id) if disc_cache is not None else None
+              cached = self._apply_cached_metadata(disc_frames, disc_codes)
+              disc_codes = [code for code in disc_codes if code.value not in cached]
+              cached_track = {}  # type: Dict[str, bytes]
+              if disc_frames is None:
+                responses = await self._async_query_responses(codes + disc_codes + track_codes)
+              else:
+                #the track needs to be known before its metadata can be looked up
+                responses = await self._async_query_responses(codes + disc_codes)
+                if OppoQueryCode.QTK in responses:
+                  cached_track = self._apply_cached_metadata(
+                    disc_cache.get_track(self._cddb_id, self.playback_attributes.track), track_codes
+                  )
+                  track_codes = [code for code in track_codes if code.value not in cached_track]
+                if track_codes:
+                  responses.update(await self._async_query_responses(track_codes))
+
+              if disc_cache is not None:
+                frames = self._new_cached_metadata(cached, disc_codes, responses)
+                if frames is not None:
+                  disc_cache.put(self._cddb_id, frames)
+                frames = self._new_cached_metadata(cached_track, track_codes, responses)
+                if frames is not None and OppoQueryCode.QTK in responses:
+                  disc_cache.put_track(self._cddb_id, self.playback_attributes.track, frames)
+            else:
+              await self._async_query(codes)
+
+            self._calculate_duration()
+        finally:
+          if suspend_events:
+            await self._async_resume_time_updates()
+
+  async def async_query_many(self, codes: Iterable[OppoQueryCode]) -> Dict[OppoQueryCode, Any]:
+    """
+    Queries the device for a batch of codes, returning the parsed value for each code that was answered.
+    State events are suspended while the batch runs, and a single updated event is sent at the end.
+    """
+    async with self._async_batch():
+      return await self._async_query(codes)
+
+  def schedule_media_update(self) -> asyncio.Task:
+    """Schedules a media update without waiting for it to complete"""
+    return self._client.loop.create_task(self.async_request_media_update())
 
   async def async_send_command(self, code: OppoRemoteCodeType):
     """Sends a remote command to the device"""
@@ -193,6 +464,80 @@ async def async_repeat_mode(self, mode: SetRepeatMode):
     """Sets the volume, accepts a level between 0 and 100"""
     await self._client.async_send_command(OppoSetRepeatModeCommand(mode))
 
+  async def _async_suspend_time_updates(self):
+    """Stops the time updates while updating (they're only sent in verbose mode)"""
+    if self._verbose_mode == SetVerboseMode.VERBOSE:
+      await self._client.async_send_command(OppoSetVerboseModeCommand(SetVerboseMode.INFO))
+
+  async def _async_resume_time_updates(self):
+    """Restores the device's verbose mode after updating"""
+    await self._client.async_send_command(OppoSetVerboseModeCommand(self._verbose_mode))
+
+  @asynccontextmanager
+  async def _async_batch(self):
+    """Groups the state changes within the block so that a single set of updating/updated events is sent"""
+    self._batch_depth += 1
+    try:
+      if self._batch_depth == 1:
+        self._client.fire_event(EVENT_DEVICE_STATE_UPDATING, self)
+      yield
+    finally:
+      self._batch_depth -= 1
+      if self._batch_depth == 0:
+        self._flush_changes(True)
+
+  def _flush_changes(self, always_notify: bool = False):
+    """Sends the updated event (if anything changed or if requested) and the changed event (if anything changed)"""
+    changes, self._changes = self._changes, {}
+    if changes or always_notify:
+      self._client.fire_event(EVENT_DEVICE_STATE_UPDATED, self)
+    if changes:
+      self._client.fire_event(EVENT_DEVICE_STATE_CHANGED, self, changes)
+
+  async def _async_query(self, codes: Iterable[OppoQueryCode]) -> Dict[OppoQueryCode, Any]:
+    """Sends a set of independent queries (duplicates removed), allowing the client to pipeline them"""
+    responses = await self._async_query_responses(codes)
+    values = {}  # type: Dict[OppoQueryCode, Any]
+    for code, response in responses.items():
+      if code == OppoQueryCode.QCD:
+        #the disc id is split over two responses, report the combined id
+        values[code] = self.cddb_id
+        continue
+      try:
+        values[code] = response.value
+      except:
+        #one bad value shouldn't lose the rest of the batch
+        _LOGGER.warning(f"Invalid value in response {response}, ignoring.", exc_info=True)
+    return values
+
+  async def _async_query_responses(self, codes: Iterable[OppoQueryCode]) -> Dict[OppoQueryCode, OppoResponse]:
+    """Sends a set of independent queries (duplicates removed), returning the responses that were received"""
+    codes = list(dict.fromkeys(codes))
+    responses = await asyncio.gather(*[self._client.async_send_command(_query_command(c)) for c in codes])
+    return { code: response for code, response in zip(codes, responses) if response is not None }
+
+  def _apply_cached_metadata(self, frames: Optional[Dict[str, bytes]], codes: Iterable[OppoQueryCode]) -> Dict[str, bytes]:
+    """Updates the state from frames in the disc cache, returning the frames that were applied"""
+    applied = {}  # type: Dict[str, bytes]
+    if not frames:
+      return applied
+    for code in codes:
+      frame = frames.get(code.value)
+      if frame is not None:
+        merge_changes(self._changes, get_response(frame).mutate_state(self))
+        applied[code.value] = frame
+    return applied
+
+  def _new_cached_metadata(self, cached: Dict[str, bytes], codes: Iterable[OppoQueryCode], responses: Dict[OppoQueryCode, OppoResponse]) -> Optional[Dict[str, bytes]]:
+    """Gets the frames to store in the disc cache (the cached frames plus the new responses), None if nothing is new"""
+    frames = dict(cached)
+    for code in codes:
+      response = responses.get(code)
+      #only responses tagged with their code can be replayed later
+      if response is not None and response.code.value == code.value:
+        frames[code.value] = response.raw_value
+    return frames if len(frames) > len(cached) else None
+
   def _reset_attributes(self):
     """Initializes/resets device attributes"""
     self.is_muted = False
@@ -211,7 +556,7 @@ def _reset_attributes(self):
     self.cddb_id_2 = ""
     self.last_update_at = datetime.utcnow()
 
-    self.playback_attributes = OppoPlaybackStatus()
+    self.playback_attributes.reset()
 
   def _calculate_duration(self):
     """Calculates the track/chapter/total duration (these are not provided by the device directly)"""
@@ -219,62 +564,149 @@ def _calculate_duration(self):
     pa.track_duration = pa.track_elapsed_time + pa.track_remaining_time
     pa.chapter_duration = pa.chapter_elapsed_time + pa.chapter_remaining_time
     pa.total_duration = pa.total_elapsed_time + pa.total_remaining_time
+    #the times were just read from the device, so extrapolate from here
+    pa.anchor(self.clock_time(), self.playback_rate)
 
-  async def _on_client_connected(self, client: 'OppoClient'):
+  def _reanchor_playback(self):
+    """Folds the extrapolated position into the playback times and re-anchors them at the current rate"""
+    pa = self.playback_attributes
+    now = self.clock_time()
+    if self._extrapolate_playback:
+      offset = pa.offset_at(now)
+      if offset:
+        old = [getattr(pa, name) for name in PLAYBACK_TIME_ATTRIBUTES]
+        pa.shift(offset)
+        for name, old_value in zip(PLAYBACK_TIME_ATTRIBUTES, old):
+          record_change(self._changes, name, old_value, getattr(pa, name))
+    pa.anchor(now, self.playback_rate)
+
+  def _on_client_connected(self, client: 'OppoClient'):
     """Handles the client connected event"""
-    self.power_status = PowerStatus.UNKNOWN
+    snapshot, self._snapshot = self._snapshot, None
+    if snapshot is not None and self.clock_time() - snapshot.taken_at <= SNAPSHOT_MAX_AGE:
+      self._restore_snapshot(snapshot)
+    else:
+      self.power_status = PowerStatus.UNKNOWN
 
-  async def _on_client_disconnected(self, client: 'OppoClient'):
+  def _on_client_disconnected(self, client: 'OppoClient'):
     """Handles the client disconnected event"""
+    self._take_snapshot()
     self.power_status = PowerStatus.DISCONNECTED
     self._reset_attributes()
 
-  async def _on_message_received(self, response: OppoResponse):
+  def _on_client_state_changed(self, old_state: OppoClientState, new_state: OppoClientState):
+    """Handles the client state changed event"""
+    #failed reconnects go from connecting to dropped, the state is only known when leaving connected
+    if old_state == OppoClientState.CONNECTED:
+      self._take_snapshot()
+
+  def _take_snapshot(self):
+    """
+    Captures the device state so it can be restored if we reconnect (only if the state is known).
+    An existing snapshot is kept, so its age is measured from when the connection was lost.
+    """
+    if self._snapshot is None and self.power_status in [PowerStatus.ON, PowerStatus.OFF]:
+      self._snapshot = OppoDeviceSnapshot(self)
+
+  def _restore_snapshot(self, snapshot: OppoDeviceSnapshot):
+    """Restores the device state from a snapshot, it's verified once the device is initialized"""
+    for name, value in snapshot.attributes.items():
+      if not name.startswith("_"):
+        record_change(self._changes, name, getattr(self, name), value)
+      setattr(self, name, value)
+    record_change(self._changes, ATTR_DEVICE_CDDB_ID, self._cddb_id, snapshot.attributes["_cddb_id"])
+    self.playback_attributes.assign(snapshot.playback_attributes, self._changes)
+    self._restored = snapshot
+
+  async def _async_verify_state(self, snapshot: OppoDeviceSnapshot):
+    """Reconciles restored state with the device, only refreshing what may have changed"""
+    async with self._async_batch():
+      #this is a new connection, so the verbose mode needs setting again before querying, 
+      #otherwise the responses aren't tagged with their codes (leave out time updates for now)
+      verbose_mode = SetVerboseMode.INFO if self._verbose_mode == SetVerboseMode.VERBOSE else self._verbose_mode
+      await self._client.async_send_command(OppoSetVerboseModeCommand(verbose_mode))
+      await self._async_query([
+        OppoQueryCode.QPW,
+        OppoQueryCode.QPL,
+        OppoQueryCode.QDT,
+        OppoQueryCode.QCD
+      ])
+
+    #turning on is handled by the power response, which runs a full update
+    if self.power_status != PowerStatus.ON or snapshot.power_status != PowerStatus.ON:
+      return
+
+    await self._async_resume_time_updates()
+    if (
+      self.disc_type != snapshot.attributes[ATTR_DEVICE_DISC_TYPE] or 
+      self._cddb_id != snapshot.attributes["_cddb_id"]
+    ):
+      await self.async_request_update()
+    elif self.is_playing:
+      #the position will have moved on while we were disconnected
+      await self.async_request_media_update()
+
+  def _on_message_received(self, response: OppoResponse):
     """Handles message received events, updating state as needed"""
     if response.result == ResultCode.ERROR:
       _LOGGER.info(f"Invalid response {response}, ignoring")
       return
 
-    if self._state_events_enabled:
-      await self._client.async_event(EVENT_DEVICE_STATE_UPDATING, self)
-
     try:
       #handle various special messages first (affecting play status/power)
       if isinstance(response, OppoPowerResponse):
-        await self._handle_power_response(response.status)
+        self._handle_power_response(response.status)
       elif isinstance(response, OppoUpdatePowerStatusResponse):
-        await self._handle_power_response(response.status)
+        self._handle_power_response(response.status)
       elif isinstance(response, OppoPlayResponse):
-        await self._handle_play_response(response.status)
+        self._handle_play_response(response.status)
+        self._reanchor_playback()
       elif isinstance(response, OppoUpdatePlayStatusResponse):
         if response.play_status:
-          await self._handle_play_response(response.play_status)
-        await response.mutate_state(self)
+          self._handle_play_response(response.play_status)
+        merge_changes(self._changes, response.mutate_state(self))
+        #the play status or speed may have changed
+        self._reanchor_playback()
       else:
         #otherwise, modify the state based on the response
-        await response.mutate_state(self)
+        merge_changes(self._changes, response.mutate_state(self))
 
       #indicate when we last updated
       self.last_update_at = datetime.utcnow()
 
-      if self._state_events_enabled:
-        await self._client.async_event(EVENT_DEVICE_STATE_UPDATED, self)
+      #only notify if something actually changed, updates within a batch
+      #are sent once the batch completes
+      if not self.is_updating and self._changes:
+        self._client.fire_event(EVENT_DEVICE_STATE_UPDATING, self)
+        self._flush_changes()
     except:
       _LOGGER.warning("Error updating state.", exc_info=True)
 
-  async def _handle_power_response(self, new_status: PowerStatus):
+  def _handle_power_response(self, new_status: PowerStatus):
     """Handles power change events"""
     if self.power_status != new_status:
+      record_change(self._changes, ATTR_DEVICE_POWER_STATUS, self.power_status, new_status)
       self.power_status = new_status
       if self.power_status == PowerStatus.ON:
-        #make sure that verbose mode is enabled
-        await self._client.async_send_command(OppoSetVerboseModeCommand(SetVerboseMode.VERBOSE))
-        #request an update of the state since it was OFF/DISCONNECTED
-        await self.async_request_update()
+        self._client.loop.create_task(self._async_on_power_on())
+      elif self.power_status == PowerStatus.OFF:
+        #the device won't answer queries while it's off
+        self._client.cancel_queued_commands()
 
-  async def _handle_play_response(self, new_status: PlayStatus):
+  def _handle_play_response(self, new_status: PlayStatus):
     """Handles play status change events"""
     if self.playback_status != new_status:
+      record_change(self._changes, ATTR_DEVICE_PLAYBACK_STATUS, self.playback_status, new_status)
       self.playback_status = new_status
-      if self.is_playing and self._state_events_enabled:
-        await self.async_request_update()
+      if self.is_playing and not self.is_updating:
+        self._client.loop.create_task(self.async_request_update())
+
+  async def _async_on_power_on(self):
+    """Handles the device turning on"""
+    #anything cached from before the device was turned on may be stale
+    if self._client.response_cache is not None:
+      self._client.response_cache.invalidate()
+    #make sure that verbose mode is enabled
+    await self._client.async_send_command(OppoSetVerboseModeCommand(self._verbose_mode))
+    #request an update of the state since it was OFF/DISCONNECTED
+    await self.async_request_update()
@@ -0,0 +1,127 @@
+import json
+import logging
+import sqlite3
+import time
+from typing import Dict, Optional
+
+_LOGGER = logging.getLogger(__name__)
+
+#default number of discs to keep, the least recently used are removed first
+DEFAULT_DISC_CACHE_SIZE = 1000
+
+class OppoDiscCache:
+  """
+  Persistent cache of disc metadata keyed by the disc (CDDB) id.  The response frames for
+  the media queries are stored in a sqlite database, so that when a known disc is loaded
+  again the playback attributes can be populated from the cache rather than re-querying the
+  device.  Disc level frames (file type, disc size, HDR and 3D status) are stored per disc,
+  anything describing what's playing (track name/album/performer, file name, audio/subtitle
+  type) is stored per disc and track number.
+
+  The default path keeps the cache in memory for the lifetime of the process.
+  """
+  def __init__(self, path: str = ":memory:", max_entries: int = DEFAULT_DISC_CACHE_SIZE):
+    self._path = path
+    self._max_entries = max_entries
+    self._connection = sqlite3.connect(path)
+    self._connection.execute(
+      "CREATE TABLE IF NOT EXISTS discs (cddb_id TEXT PRIMARY KEY, frames TEXT NOT NULL, used_at REAL NOT NULL)"
+    )
+    self._connection.execute(
+      "CREATE TABLE IF NOT EXISTS tracks (cddb_id TEXT NOT NULL, track INTEGER NOT NULL, frames TEXT NOT NULL, PRIMARY KEY (cddb_id, track))"
+    )
+    self._connection.commit()
+
+  @property
+  def path(self) -> str:
+    """Gets the path of the database"""
+    return self._path
+
+  def __len__(self) -> int:
+    return self._connection.execute("SELECT COUNT(*) FROM discs").fetchone()[0]
+
+  def __contains__(self, cddb_id: str) -> bool:
+    return self._connection.execute("SELECT 1 FROM discs WHERE cddb_id = ?", (cddb_id,)).fetchone() is not None
+
+  def get(self, cddb_id: str) -> Optional[Dict[str, bytes]]:
+    """Gets the cached response frames (keyed by query code) for a disc, or None if it's not cached"""
+    row = self._connection.execute("SELECT frames FROM discs WHERE cddb_id = ?", (cddb_id,)).fetchone()
+    if row is None:
+      return None
+    frames = self._decode(row[0])
+    if frames is None:
+      _LOGGER.warning(f"Invalid cache entry for disc {cddb_id}, removing it.")
+      self.remove(cddb_id)
+      return None
+    self._connection.execute("UPDATE discs SET used_at = ? WHERE cddb_id = ?", (time.time(), cddb_id))
+    self._connection.commit()
+    return frames
+
+  def get_track(self, cddb_id: str, track: int) -> Optional[Dict[str, bytes]]:
+    """Gets the cached response frames (keyed by query code) for a track of a disc, or None if it's not cached"""
+    row = self._connection.execute("SELECT frames FROM tracks WHERE cddb_id = ? AND track = ?", (cddb_id, track)).fetchone()
+    if row is None:
+      return None
+    frames = self._decode(row[0])
+    if frames is None:
+      _LOGGER.warning(f"Invalid cache entry for track {track} of disc {cddb_id}, removing it.")
+      self._connection.execute("DELETE FROM tracks WHERE cddb_id = ? AND track = ?", (cddb_id, track))
+      self._connection.commit()
+    return frames
+
+  def put(self, cddb_id: str, frames: Dict[str, bytes]):
+    """Stores the response frames (keyed by query code) for a disc"""
+    self._connection.execute(
+      "INSERT OR REPLACE INTO discs (cddb_id, frames, used_at) VALUES (?, ?, ?)",
+      (cddb_id, self._encode(frames), time.time())
+    )
+    self._evict()
+
+  def put_track(self, cddb_id: str, track: int, frames: Dict[str, bytes]):
+    """Stores the response frames (keyed by query code) for a track of a disc"""
+    #the disc entry tracks when the disc was last used, so make sure there is one
+    self._connection.execute(
+      "INSERT OR IGNORE INTO discs (cddb_id, frames, used_at) VALUES (?, ?, ?)",
+      (cddb_id, "{}", time.time())
+    )
+    self._connection.execute(
+      "INSERT OR REPLACE INTO tracks (cddb_id, track, frames) VALUES (?, ?, ?)",
+      (cddb_id, track, self._encode(frames))
+    )
+    self._evict()
+
+  def remove(self, cddb_id: str):
+    """Removes a disc (and its tracks) from the cache"""
+    self._connection.execute("DELETE FROM discs WHERE cddb_id = ?", (cddb_id,))
+    self._connection.execute("DELETE FROM tracks WHERE cddb_id = ?", (cddb_id,))
+    self._connection.commit()
+
+  def clear(self):
+    """Removes all of the discs from the cache"""
+    self._connection.execute("DELETE FROM discs")
+    self._connection.execute("DELETE FROM tracks")
+    self._connection.commit()
+
+  def close(self):
+    """Closes the database"""
+    self._connection.close()
+
+  def _evict(self):
+    """Removes the least recently used discs (and their tracks) over the limit, committing any changes"""
+    self._connection.execute(
+      "DELETE FROM discs WHERE cddb_id NOT IN (SELECT cddb_id FROM discs ORDER BY used_at DESC LIMIT ?)",
+      (self._max_entries,)
+    )
+    self._connection.execute("DELETE FROM tracks WHERE cddb_id NOT IN (SELECT cddb_id FROM discs)")
+    self._connection.commit()
+
+  @staticmethod
+  def _encode(frames: Dict[str, bytes]) -> str:
+    return json.dumps({ code: frame.decode("latin-1") for code, frame in frames.items() })
+
+  @staticmethod
+  def _decode(data: str) -> Optional[Dict[str, bytes]]:
+    try:
+      return { code: frame.encode("latin-1") for code, frame in json.loads(data).items() }
+    except (ValueError, AttributeError):
+      return None
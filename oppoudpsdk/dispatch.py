@@ -0,0 +1,73 @@
+import asyncio
+import inspect
+import logging
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from .const import EVENT_DEVICE_STATE_UPDATED, EVENT_DEVICE_STATE_CHANGED
+from .response import merge_changes
+
+_LOGGER = logging.getLogger(__name__)
+
+#events that can be coalesced, the first argument is always the device
+COALESCED_EVENTS = [EVENT_DEVICE_STATE_UPDATED, EVENT_DEVICE_STATE_CHANGED]
+
+def run_event_handlers(handlers: Iterable[Callable], event: str, args: tuple, kwargs: dict, loop: asyncio.AbstractEventLoop):
+  """Runs event handlers inline, scheduling the result as a task if a handler returns an awaitable"""
+  for cb in handlers:
+    try:
+      result = cb(*args, **kwargs)
+    except:
+      _LOGGER.warning(f"Error in event handler for {event}.", exc_info=True)
+      continue
+    if inspect.isawaitable(result):
+      asyncio.ensure_future(result, loop=loop)
+
+class OppoEventCoalescer:
+  """
+  Merges bursts of device state events into a single dispatch.  The first state event
+  starts a window, further state events for the same device within the window are
+  merged (changes are combined) and dispatched once when the window closes.
+  """
+  def __init__(self, window: float, dispatch: Callable[..., None], loop: asyncio.AbstractEventLoop):
+    self._window = window
+    self._dispatch = dispatch
+    self._loop = loop
+    self._pending = {}  # type: Dict[Tuple[str, Hashable], List[Any]]
+    self._flush_handle = None  # type: Optional[asyncio.TimerHandle]
+
+  @property
+  def window(self) -> float:
+    """Gets the coalescing window (in seconds)"""
+    return self._window
+
+  def coalesce(self, event: str, *args) -> bool:
+    """Queues the event if it can be coalesced, returns False if it should be dispatched directly"""
+    if event not in COALESCED_EVENTS or not args:
+      return False
+
+    key = (event, id(args[0]))
+    pending = self._pending.get(key)
+    if pending is None:
+      pending = list(args)
+      if event == EVENT_DEVICE_STATE_CHANGED:
+        #copy the changes since we'll be merging into them
+        pending[1] = dict(pending[1])
+      self._pending[key] = pending
+    elif event == EVENT_DEVICE_STATE_CHANGED:
+      merge_changes(pending[1], args[1])
+
+    if self._flush_handle is None:
+      self._flush_handle = self._loop.call_later(self._window, self.flush)
+    return True
+
+  def flush(self):
+    """Dispatches all of the pending events"""
+    if self._flush_handle is not None:
+      self._flush_handle.cancel()
+      self._flush_handle = None
+    pending, self._pending = self._pending, {}
+    for (event, _), args in pending.items():
+      #changes may have cancelled each other out over the window
+      if event == EVENT_DEVICE_STATE_CHANGED and not args[1]:
+        continue
+      self._dispatch(event, *args)
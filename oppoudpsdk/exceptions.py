@@ -22,3 +22,17 @@ def __init__(self, message: str, *args: object) -> None:
     def __str__(self) -> str:
         return f"Invalid operation: {self.message}"
 
+class OppoCommandTimeoutError(OppoException):
+    """ Exception raised when the device does not respond to a command in time """
+    def __init__(self, code, timeout: float, *args: object) -> None:
+        super().__init__(*args)
+        self.code = code
+        self.timeout = timeout
+    
+    def __str__(self) -> str:
+        return f"Timed out waiting for a command response: Code={self.code}, Timeout={self.timeout}s"
+
+class OppoCommandCancelledError(OppoCommandError):
+    """ Exception raised when a queued command is cancelled before it is sent """
+    def __init__(self, code, *args: object) -> None:
+        super().__init__("The command was cancelled before it was sent", code, None, *args)
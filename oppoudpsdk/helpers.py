@@ -1,9 +1,68 @@
+import asyncio
 from string import Formatter
 from datetime import timedelta
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Optional
 
 def clamp(n, minn, maxn):
     return max(min(maxn, n), minn)  
 
+@lru_cache(maxsize=512)
+def parse_time(value: str) -> timedelta:
+    """Parses a HH:MM:SS time (as sent by the device) into a timedelta"""
+    hours, minutes, seconds = value.split(":")
+    return timedelta(hours=int(hours), minutes=int(minutes), seconds=int(seconds))
+
+class SingleFlight:
+    """
+    Runs an operation at most once at a time.  Calls made while it's running don't start another
+    run, they all share a single trailing run that starts once the current one has finished (so
+    anything that changed while it was running is still picked up).
+    """
+    def __init__(self, operation: Callable[[], Awaitable[Any]]):
+        self._operation = operation
+        self._running = None  # type: Optional[asyncio.Future]
+        self._trailing = None  # type: Optional[asyncio.Future]
+
+    @property
+    def running(self) -> bool:
+        """Whether the operation is running (or a trailing run is about to start)"""
+        return self._running is not None or self._trailing is not None
+
+    async def run(self) -> Any:
+        """Runs the operation, or joins the trailing run if it's already running"""
+        if self._trailing is not None:
+            task = self._trailing
+        elif self._running is not None:
+            task = self._trailing = asyncio.ensure_future(self._run_after(self._running))
+            task.add_done_callback(self._on_done)
+        else:
+            task = self._running = asyncio.ensure_future(self._operation())
+            task.add_done_callback(self._on_done)
+        #a cancelled caller doesn't cancel the run shared with the others
+        return await asyncio.shield(task)
+
+    async def wait(self):
+        """Waits for the current run (and the trailing run, if there is one) without starting one"""
+        task = self._trailing or self._running
+        if task is not None:
+            await asyncio.shield(task)
+
+    async def _run_after(self, previous: asyncio.Future) -> Any:
+        await asyncio.wait([previous])
+        self._running, self._trailing = self._trailing, None
+        return await self._operation()
+
+    def _on_done(self, task: asyncio.Future):
+        if self._running is task:
+            self._running = None
+        if self._trailing is task:
+            #cancelled before it started
+            self._trailing = None
+        if not task.cancelled():
+            #callers see the exception, this stops it being logged when there weren't any left
+            task.exception()
+
 # from: https://stackoverflow.com/questions/538666/format-timedelta-to-string
 def strfdelta(tdelta, fmt='{D:02}d {H:02}h {M:02}m {S:02}s', inputtype='timedelta'):
     """Convert a datetime.timedelta object or a regular number to a custom-
@@ -0,0 +1,202 @@
+import time
+from bisect import bisect_left
+from typing import Any, Callable, DefaultDict, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+#upper bounds (in seconds) of the command round trip histogram buckets
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+#upper bounds (in seconds) of the parse/dispatch time histogram buckets
+DEFAULT_DURATION_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01)
+
+class OppoHistogram:
+  """Counts observations into buckets by their upper bound, plus an overflow bucket"""
+  __slots__ = ('buckets', 'counts', 'count', 'sum')
+
+  def __init__(self, buckets: Sequence[float]):
+    self.buckets = tuple(buckets)
+    self.counts = [0] * (len(self.buckets) + 1)
+    self.count = 0
+    self.sum = 0.0
+
+  def __repr__(self) -> str:
+    return f"OppoHistogram(count={self.count}, sum={self.sum:.6f})"
+
+  def observe(self, value: float):
+    """Records an observation"""
+    self.counts[bisect_left(self.buckets, value)] += 1
+    self.count += 1
+    self.sum += value
+
+  def cumulative(self) -> List[Tuple[float, int]]:
+    """Gets the (upper bound, observations at or below it) for each bucket, ending with infinity"""
+    result = []
+    total = 0
+    for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+      total += count
+      result.append((bound, total))
+    return result
+
+  def quantile(self, q: float) -> Optional[float]:
+    """Estimates a quantile (0-1) as the upper bound of the bucket it falls in, None if there are no observations"""
+    if not self.count:
+      return None
+    rank = q * self.count
+    for bound, total in self.cumulative():
+      if total >= rank:
+        return bound
+    return float("inf")
+
+  def as_dict(self) -> Dict[str, Any]:
+    """Gets the histogram as a dictionary"""
+    return {
+      "count": self.count,
+      "sum": self.sum,
+      "mean": self.sum / self.count if self.count else None,
+      "p50": self.quantile(0.5),
+      "p99": self.quantile(0.99),
+      "buckets": { bound: total for bound, total in self.cumulative() },
+    }
+
+class OppoMetrics:
+  """
+  Collects timings and counters for a client: the round trip latency (from writing a command to
+  its matched response) and timeouts per command code, frames received per code, frame parse
+  time, event dispatch time per event and the command queue depth (waiting or outstanding).
+  """
+  def __init__(
+    self,
+    latency_buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+    duration_buckets: Sequence[float] = DEFAULT_DURATION_BUCKETS,
+    clock: Callable[[], float] = time.perf_counter
+  ):
+    self._latency_buckets = latency_buckets
+    self._duration_buckets = duration_buckets
+    self.clock = clock
+    self.reset()
+
+  def reset(self):
+    """Clears all of the metrics"""
+    self.started_at = self.clock()
+    self.command_latency = {}  # type: Dict[str, OppoHistogram]
+    self.command_timeouts = DefaultDict(int)  # type: DefaultDict[str, int]
+    self.frames_received = DefaultDict(int)  # type: DefaultDict[str, int]
+    self.parse_time = OppoHistogram(self._duration_buckets)
+    self.dispatch_time = {}  # type: Dict[str, OppoHistogram]
+    self.queue_depth = 0
+    self.max_queue_depth = 0
+
+  def observe_command(self, code: str, seconds: float):
+    """Records the round trip time of a command"""
+    histogram = self.command_latency.get(code)
+    if histogram is None:
+      histogram = self.command_latency[code] = OppoHistogram(self._latency_buckets)
+    histogram.observe(seconds)
+
+  def record_timeout(self, code: str):
+    """Records a command that timed out"""
+    self.command_timeouts[code] += 1
+
+  def observe_frame(self, code: str, seconds: float):
+    """Records a received frame and the time it took to parse"""
+    self.frames_received[code] += 1
+    self.parse_time.observe(seconds)
+
+  def observe_dispatch(self, event: str, seconds: float):
+    """Records the time taken to run an event's handlers"""
+    histogram = self.dispatch_time.get(event)
+    if histogram is None:
+      histogram = self.dispatch_time[event] = OppoHistogram(self._duration_buckets)
+    histogram.observe(seconds)
+
+  def command_queued(self):
+    """Records a command waiting to be sent or for its response"""
+    self.queue_depth += 1
+    if self.queue_depth > self.max_queue_depth:
+      self.max_queue_depth = self.queue_depth
+
+  def command_done(self):
+    """Records a command that has been answered (or failed)"""
+    self.queue_depth -= 1
+
+  def snapshot(self) -> Dict[str, Any]:
+    """Gets the metrics as a dictionary, frame rates are per second since the metrics were reset"""
+    uptime = self.clock() - self.started_at
+    return {
+      "uptime": uptime,
+      "command_latency": { code: h.as_dict() for code, h in self.command_latency.items() },
+      "command_timeouts": dict(self.command_timeouts),
+      "frames_received": dict(self.frames_received),
+      "frame_rates": { code: count / uptime for code, count in self.frames_received.items() } if uptime > 0 else {},
+      "parse_time": self.parse_time.as_dict(),
+      "dispatch_time": { event: h.as_dict() for event, h in self.dispatch_time.items() },
+      "queue_depth": self.queue_depth,
+      "max_queue_depth": self.max_queue_depth,
+    }
+
+  def to_prometheus(self, prefix: str = "oppo") -> str:
+    """Gets the metrics in the Prometheus text exposition format"""
+    return export_prometheus({ "": self }, prefix)
+
+def export_prometheus(metrics: Dict[str, OppoMetrics], prefix: str = "oppo", label: str = "device") -> str:
+  """
+  Gets the metrics for many clients in the Prometheus text exposition format (which is
+  also valid OpenMetrics), each client's series are labelled with its key.
+  """
+  lines = []  # type: List[str]
+
+  def family(name: str, kind: str, help: str, samples: Iterable[Tuple[str, Dict[str, str], float]]):
+    samples = list(samples)
+    if not samples:
+      return
+    lines.append(f"# HELP {prefix}_{name} {help}")
+    lines.append(f"# TYPE {prefix}_{name} {kind}")
+    for suffix, labels, value in samples:
+      lines.append(f"{prefix}_{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+
+  def labels_for(key: str, **extra) -> Dict[str, str]:
+    labels = { label: key } if key else {}
+    labels.update(extra)
+    return labels
+
+  family("command_latency_seconds", "histogram", "Time from writing a command to its matched response.", (
+    sample for key, m in metrics.items() for code, h in sorted(m.command_latency.items())
+    for sample in _histogram_samples(h, labels_for(key, code=code))
+  ))
+  family("command_timeouts_total", "counter", "Commands that were not answered in time.", (
+    ("", labels_for(key, code=code), count) for key, m in metrics.items() for code, count in sorted(m.command_timeouts.items())
+  ))
+  family("frames_received_total", "counter", "Frames received from the device.", (
+    ("", labels_for(key, code=code), count) for key, m in metrics.items() for code, count in sorted(m.frames_received.items())
+  ))
+  family("frame_parse_seconds", "histogram", "Time taken to parse a received frame.", (
+    sample for key, m in metrics.items() if m.parse_time.count for sample in _histogram_samples(m.parse_time, labels_for(key))
+  ))
+  family("event_dispatch_seconds", "histogram", "Time taken to run the handlers for an event.", (
+    sample for key, m in metrics.items() for event, h in sorted(m.dispatch_time.items())
+    for sample in _histogram_samples(h, labels_for(key, event=event))
+  ))
+  family("command_queue_depth", "gauge", "Commands waiting to be sent or for their response.", (
+    ("", labels_for(key), m.queue_depth) for key, m in metrics.items()
+  ))
+  family("command_queue_depth_max", "gauge", "Largest command queue depth seen.", (
+    ("", labels_for(key), m.max_queue_depth) for key, m in metrics.items()
+  ))
+  return "\n".join(lines) + "\n" if lines else ""
+
+def _histogram_samples(histogram: OppoHistogram, labels: Dict[str, str]) -> Iterator[Tuple[str, Dict[str, str], float]]:
+  for bound, total in histogram.cumulative():
+    yield "_bucket", dict(labels, le=_format_value(bound)), total
+  yield "_sum", labels, histogram.sum
+  yield "_count", labels, histogram.count
+
+def _format_labels(labels: Dict[str, str]) -> str:
+  if not labels:
+    return ""
+  escaped = (str(v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for v in labels.values())
+  return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+def _format_value(value: float) -> str:
+  if value == float("inf"):
+    return "+Inf"
+  if isinstance(value, int):
+    return str(value)
+  return repr(float(value))
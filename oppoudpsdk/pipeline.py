@@ -0,0 +1,160 @@
+import asyncio
+import heapq
+import itertools
+from collections import deque
+from typing import Callable, Deque, DefaultDict, List, Optional, Tuple
+
+from .codes import OppoCode
+from .command import OppoCommand, OppoQueryCommand
+from .exceptions import OppoCommandCancelledError, OppoCommandError
+from .response import OppoResponse
+
+#command priorities, lower values are sent first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_QUERY = 10
+
+def command_priority(command: OppoCommand) -> int:
+  """Gets the priority of a command, remote and set commands are sent ahead of queries"""
+  return PRIORITY_QUERY if isinstance(command, OppoQueryCommand) else PRIORITY_INTERACTIVE
+
+class OppoPendingCommand:
+  """Represents a command that has been sent and is waiting on its response"""
+  __slots__ = ('command', 'future')
+
+  def __init__(self, command: OppoCommand, future: asyncio.Future):
+    self.command = command
+    self.future = future
+
+class OppoCommandPipeline:
+  """
+  Correlation table for commands that have been written to the device.
+
+  Multiple commands can be outstanding at once, responses are matched to the
+  oldest outstanding command that expects the response code.  Responses without
+  a code (@OK/@ER when the device is not in verbose mode) are matched to the
+  oldest outstanding command.
+  """
+  def __init__(self):
+    self._outstanding = []  # type: List[OppoPendingCommand]
+    self._by_code = DefaultDict(deque)  # type: DefaultDict[str, Deque[OppoPendingCommand]]
+
+  def __len__(self) -> int:
+    return len(self._outstanding)
+
+  def register(self, command: OppoCommand, future: asyncio.Future) -> OppoPendingCommand:
+    """Registers a command as outstanding, must be called before the command is written"""
+    pending = OppoPendingCommand(command, future)
+    self._outstanding.append(pending)
+    for code in command.expected_response_codes:
+      self._by_code[code].append(pending)
+    return pending
+
+  def unregister(self, pending: OppoPendingCommand):
+    """Removes a command from the table (i.e. it was answered, timed out or cancelled)"""
+    try:
+      self._outstanding.remove(pending)
+    except ValueError:
+      return
+    for code in pending.command.expected_response_codes:
+      waiting = self._by_code.get(code)
+      if waiting is not None:
+        waiting.remove(pending)
+        if not waiting:
+          del self._by_code[code]
+
+  def match(self, response: OppoResponse) -> Optional[OppoPendingCommand]:
+    """Finds the outstanding command answered by the response, resolving and removing it"""
+    pending = None
+    if response.raw_value[:3] in [b"@OK",b"@ER"]:
+      #if we're not in the right mode, we just need to assume it answers the oldest command
+      if self._outstanding:
+        pending = self._outstanding[0]
+    elif isinstance(response.code, OppoCode):
+      waiting = self._by_code.get(response.code.value)
+      if waiting:
+        pending = waiting[0]
+
+    if pending is None:
+      return None
+
+    self.unregister(pending)
+    if not pending.future.done():
+      pending.future.set_result(response)
+    return pending
+
+  def clear(self):
+    """Fails all outstanding commands (i.e. the connection was closed)"""
+    for pending in list(self._outstanding):
+      self.unregister(pending)
+      if not pending.future.done():
+        pending.future.set_exception(OppoCommandError(
+          "The connection was closed before a response was received", pending.command.code, None
+        ))
+
+class OppoQueuedCommand:
+  """Represents a command waiting for a pipeline slot"""
+  __slots__ = ('command', 'priority', 'future')
+
+  def __init__(self, command: OppoCommand, priority: int, future: asyncio.Future):
+    self.command = command
+    self.priority = priority
+    self.future = future
+
+class OppoCommandQueue:
+  """
+  Hands out the pipeline slots to the commands waiting to be sent.  When a slot is freed it
+  goes to the waiting command with the lowest priority value (oldest first), so interactive 
+  commands are sent ahead of queued background queries.  Waiting commands can be cancelled,
+  i.e. queries that are no longer needed.
+  """
+  def __init__(self, slots: int):
+    self._free = max(1, slots)
+    self._waiting = []  # type: List[Tuple[int, int, OppoQueuedCommand]]
+    self._counter = itertools.count()
+
+  def __len__(self) -> int:
+    return sum(1 for _, _, queued in self._waiting if not queued.future.done())
+
+  @property
+  def free(self) -> int:
+    """Gets the number of free slots"""
+    return self._free
+
+  async def acquire(self, command: OppoCommand, priority: Optional[int] = None):
+    """Waits for a slot to send the command in, raises OppoCommandCancelledError if it's cancelled while waiting"""
+    if priority is None:
+      priority = command_priority(command)
+    if self._free > 0 and not self._waiting:
+      self._free -= 1
+      return
+
+    queued = OppoQueuedCommand(command, priority, asyncio.get_event_loop().create_future())
+    heapq.heappush(self._waiting, (priority, next(self._counter), queued))
+    try:
+      await queued.future
+    except asyncio.CancelledError:
+      #if the slot was handed over as the task was cancelled, pass it on
+      if queued.future.done() and not queued.future.cancelled() and queued.future.exception() is None:
+        self.release()
+      raise
+
+  def release(self):
+    """Frees a slot, handing it to the next waiting command"""
+    while self._waiting:
+      _, _, queued = heapq.heappop(self._waiting)
+      #cancelled commands are left in the heap, skip them
+      if not queued.future.done():
+        queued.future.set_result(None)
+        return
+    self._free += 1
+
+  def cancel(self, predicate: Optional[Callable[[OppoCommand], bool]] = None) -> int:
+    """Cancels the waiting commands (those matching the predicate, if given), returning how many were cancelled"""
+    cancelled = 0
+    for _, _, queued in self._waiting:
+      if not queued.future.done() and (predicate is None or predicate(queued.command)):
+        queued.future.set_exception(OppoCommandCancelledError(queued.command.code))
+        cancelled += 1
+    self._waiting = [entry for entry in self._waiting if not entry[2].future.done()]
+    heapq.heapify(self._waiting)
+    return cancelled
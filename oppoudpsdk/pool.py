@@ -0,0 +1,250 @@
+import asyncio
+import logging
+from datetime import datetime
+from functools import partial
+from typing import Any, Callable, DefaultDict, Dict, Iterator, List, Optional, Tuple
+
+from .client import OppoClient
+from .const import *
+from .dispatch import run_event_handlers
+from .metrics import OppoMetrics, export_prometheus
+from .response import OppoResponse, ResultCode
+from .scheduler import OppoRefreshScheduler
+from .states import OppoClientState
+
+_LOGGER = logging.getLogger(__name__)
+
+class OppoClientStats:
+  """Counters for a client managed by a pool"""
+  __slots__ = ('commands_sent', 'responses_received', 'messages_received', 'errors', 'connects', 'drops', 'last_message_at')
+
+  def __init__(self):
+    self.commands_sent = 0
+    self.responses_received = 0
+    self.messages_received = 0
+    self.errors = 0
+    self.connects = 0
+    self.drops = 0
+    self.last_message_at = None  # type: Optional[datetime]
+
+  def __repr__(self) -> str:
+    return f"OppoClientStats({', '.join(f'{k}={v!r}' for k, v in self.as_dict().items())})"
+
+  def as_dict(self) -> Dict[str, Any]:
+    """Gets the counters as a dictionary"""
+    return { name: getattr(self, name) for name in self.__slots__ }
+
+class OppoClientPool:
+  """
+  Manages many clients on a single event loop.  The connections all share the loop's
+  selector, periodic refreshes are run by one shared scheduler, and events from every
+  client are raised through a shared dispatcher (handlers receive the client first,
+  followed by the usual event arguments).
+
+  If collect_metrics is set, each client the pool creates gets its own OppoMetrics.
+
+  Extra keyword arguments are passed through to each OppoClient that the pool creates.
+  """
+  def __init__(self, event_loop: Optional[asyncio.AbstractEventLoop] = None, refresh_interval: float = DEFAULT_REFRESH_INTERVAL, max_concurrent_refreshes: int = DEFAULT_MAX_CONCURRENT_REFRESHES, scheduler: Optional[OppoRefreshScheduler] = None, collect_metrics: bool = False, **client_options):
+    self._loop = event_loop
+    self._collect_metrics = collect_metrics
+    self._client_options = client_options
+    self._clients = {}  # type: Dict[str, OppoClient]
+    self._stats = {}  # type: Dict[str, OppoClientStats]
+    self._tasks = {}  # type: Dict[str, asyncio.Task]
+    self._handlers = {}  # type: Dict[str, List[Tuple[str, Callable]]]
+    self._event_handlers = DefaultDict(list)  # type: Dict[str, List[Callable]]
+    if scheduler is None:
+      scheduler = OppoRefreshScheduler(refresh_interval, max_concurrent_refreshes, event_loop)
+    self._scheduler = scheduler
+    self._running = False
+
+  def __len__(self) -> int:
+    return len(self._clients)
+
+  def __iter__(self) -> Iterator[OppoClient]:
+    return iter(list(self._clients.values()))
+
+  def __contains__(self, key: str) -> bool:
+    return key in self._clients
+
+  def __getitem__(self, key: str) -> OppoClient:
+    return self._clients[key]
+
+  @property
+  def loop(self) -> asyncio.AbstractEventLoop:
+    """Gets the asyncio event loop"""
+    if self._loop is None:
+      self._loop = asyncio.get_event_loop()
+    return self._loop
+
+  @property
+  def clients(self) -> List[OppoClient]:
+    """Gets the clients in the pool"""
+    return list(self._clients.values())
+
+  @property
+  def scheduler(self) -> OppoRefreshScheduler:
+    """Gets the shared refresh scheduler"""
+    return self._scheduler
+
+  @property
+  def stats(self) -> Dict[str, OppoClientStats]:
+    """Gets the stats for each client, keyed by host:port"""
+    return dict(self._stats)
+
+  @property
+  def metrics(self) -> Dict[str, OppoMetrics]:
+    """Gets the metrics for each client that collects them, keyed by host:port"""
+    return { key: client.metrics for key, client in self._clients.items() if client.metrics is not None }
+
+  def export_metrics(self, prefix: str = "oppo") -> str:
+    """Gets the metrics for all of the clients in the Prometheus text format, labelled by host:port"""
+    return export_prometheus(self.metrics, prefix)
+
+  @property
+  def running(self) -> bool:
+    """Indicates whether the pool is running"""
+    return self._running
+
+  @staticmethod
+  def key_for(client: OppoClient) -> str:
+    """Gets the key a client is stored under in the pool"""
+    return f"{client.host_name}:{client.port_number}"
+
+  def add(self, host_name: str, port_number: int = 23, mac_address: Optional[str] = None, **client_options) -> OppoClient:
+    """Creates a client for a device and adds it to the pool"""
+    options = dict(self._client_options)
+    options.update(client_options)
+    if self._collect_metrics and options.get("metrics") is None:
+      options["metrics"] = OppoMetrics()
+    client = OppoClient(host_name, port_number, mac_address, self.loop, **options)
+    self.add_client(client)
+    return client
+
+  def add_client(self, client: OppoClient):
+    """Adds an existing client to the pool, the client is started if the pool is running"""
+    key = self.key_for(client)
+    if key in self._clients:
+      raise ValueError(f"A client for {key} is already in the pool")
+
+    stats = OppoClientStats()
+    self._clients[key] = client
+    self._stats[key] = stats
+    self._handlers[key] = []
+
+    self._attach(key, EVENT_COMMAND_SENT, partial(self._on_command_sent, stats))
+    self._attach(key, EVENT_COMMAND_RESPONSE, partial(self._on_command_response, stats))
+    self._attach(key, EVENT_MESSAGE_RECEIVED, partial(self._on_message_received, stats))
+    self._attach(key, EVENT_STATE_CHANGED, partial(self._on_state_changed, stats))
+    self._attach(key, EVENT_READY, self._on_ready)
+    self._attach(key, EVENT_DEVICE_STATE_CHANGED, partial(self._on_device_state_changed, client))
+    for event in self._event_handlers:
+      self._attach(key, event, partial(self._dispatch_event, client, event))
+
+    if self._running:
+      self._start_client(client)
+
+  async def async_remove(self, client: OppoClient):
+    """Disconnects a client and removes it from the pool"""
+    key = self.key_for(client)
+    if self._clients.get(key) is not client:
+      return
+    self._scheduler.remove(client)
+    for event, callback in self._handlers.pop(key):
+      client.remove_event_handler(event, callback)
+    del self._clients[key]
+    del self._stats[key]
+
+    task = self._tasks.pop(key, None)
+    await client.disconnect()
+    if task is not None:
+      await asyncio.gather(task, return_exceptions=True)
+
+  def add_event_handler(self, event: str, callback: Callable):
+    """Adds an event handler for an event raised by any client in the pool"""
+    if event not in self._event_handlers:
+      for key, client in self._clients.items():
+        self._attach(key, event, partial(self._dispatch_event, client, event))
+    self._event_handlers[event].append(callback)
+
+  def remove_event_handler(self, event: str, callback: Callable):
+    """Removes an event handler for an event"""
+    try:
+      self._event_handlers[event].remove(callback)
+    except:
+      _LOGGER.warn(f"could not remove event handler {event}-{callback}")
+
+  def start(self):
+    """Starts all of the clients and the refresh scheduler"""
+    if self._running:
+      return
+    self._running = True
+    self._scheduler.start()
+    for client in self._clients.values():
+      self._start_client(client)
+
+  async def async_run(self):
+    """Runs the pool until it's stopped"""
+    self.start()
+    while self._running:
+      tasks = list(self._tasks.values())
+      if not tasks:
+        break
+      await asyncio.wait(tasks)
+      #clients can be added while we're waiting
+      for key in [k for k, t in self._tasks.items() if t.done()]:
+        del self._tasks[key]
+
+  async def async_stop(self):
+    """Stops the refresh scheduler and disconnects all of the clients"""
+    self._running = False
+    await self._scheduler.async_stop()
+    await asyncio.gather(*[client.disconnect() for client in self._clients.values()], return_exceptions=True)
+    tasks, self._tasks = list(self._tasks.values()), {}
+    if tasks:
+      await asyncio.gather(*tasks, return_exceptions=True)
+
+  def _start_client(self, client: OppoClient):
+    """Starts a client's connection loop (internal)"""
+    key = self.key_for(client)
+    task = self._tasks.get(key)
+    if task is None or task.done():
+      self._tasks[key] = self.loop.create_task(client.async_run_client())
+
+  def _attach(self, key: str, event: str, callback: Callable):
+    """Adds a handler to a client, remembering it so it can be removed (internal)"""
+    self._clients[key].add_event_handler(event, callback)
+    self._handlers[key].append((event, callback))
+
+  def _dispatch_event(self, client: OppoClient, event: str, *args, **kwargs):
+    """Raises a client's event through the pool's handlers (internal)"""
+    run_event_handlers(self._event_handlers[event], event, (client,) + args, kwargs, self.loop)
+
+  def _on_ready(self, client: OppoClient):
+    """Handles a client being ready by scheduling its refreshes"""
+    if self._running:
+      self._scheduler.add(client)
+
+  def _on_device_state_changed(self, client: OppoClient, device, changes):
+    """Handles device state changes, the refresh interval may depend on the state"""
+    if self._running:
+      self._scheduler.reschedule(client)
+
+  def _on_command_sent(self, stats: OppoClientStats, command):
+    stats.commands_sent += 1
+
+  def _on_command_response(self, stats: OppoClientStats, response: OppoResponse):
+    stats.responses_received += 1
+
+  def _on_message_received(self, stats: OppoClientStats, response: OppoResponse):
+    stats.messages_received += 1
+    stats.last_message_at = datetime.now()
+    if response.result == ResultCode.ERROR:
+      stats.errors += 1
+
+  def _on_state_changed(self, stats: OppoClientStats, old_state: OppoClientState, new_state: OppoClientState):
+    if new_state == OppoClientState.CONNECTED:
+      stats.connects += 1
+    elif new_state == OppoClientState.DROPPED:
+      stats.drops += 1
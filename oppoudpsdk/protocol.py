@@ -0,0 +1,128 @@
+import asyncio
+from collections import deque
+from typing import Callable, Deque, List, Optional
+
+FRAME_TERMINATOR = b'\r'
+#maximum number of frames written to the transport at once
+DEFAULT_MAX_WRITE_BATCH = 16
+
+class OppoProtocol(asyncio.Protocol):
+  """
+  Streaming protocol for the Oppo control connection.  Received bytes are split into
+  frames on the carriage return terminator and each complete frame is passed to the
+  frame handler, partial frames are buffered until the rest arrives.
+
+  Frames written during the same loop iteration are coalesced into a single transport 
+  write of at most max_write_batch frames, any remaining frames are written on the
+  following iterations.
+  """
+  def __init__(self, on_frame: Callable[[bytes], None], loop: asyncio.AbstractEventLoop, max_write_batch: int = DEFAULT_MAX_WRITE_BATCH):
+    self._on_frame = on_frame
+    self._loop = loop
+    self._max_write_batch = max(1, max_write_batch)
+    self._pending_writes = []  # type: List[bytes]
+    self._flush_handle = None  # type: Optional[asyncio.Handle]
+    self._buffer = bytearray()
+    self._transport = None  # type: Optional[asyncio.Transport]
+    self._closed = loop.create_future()
+    self._paused = False
+    self._drain_waiters = deque()  # type: Deque[asyncio.Future]
+
+  @property
+  def transport(self) -> Optional[asyncio.Transport]:
+    """Gets the transport for the connection"""
+    return self._transport
+
+  @property
+  def is_closed(self) -> bool:
+    """Indicates whether the connection has been lost"""
+    return self._closed.done()
+
+  def connection_made(self, transport: asyncio.Transport):
+    self._transport = transport
+
+  def connection_lost(self, exc: Optional[Exception]):
+    self._pending_writes.clear()
+    if self._flush_handle is not None:
+      self._flush_handle.cancel()
+      self._flush_handle = None
+    if not self._closed.done():
+      self._closed.set_result(exc)
+    self._wake_drain_waiters(ConnectionResetError('Connection lost'))
+
+  def data_received(self, data: bytes):
+    #common case: no partial frame pending, so scan the received data directly
+    if self._buffer:
+      self._buffer += data
+      data = bytes(self._buffer)
+      self._buffer.clear()
+
+    find = data.find
+    start = 0
+    end = find(FRAME_TERMINATOR)
+    while end >= 0:
+      self._on_frame(data[start:end + 1])
+      start = end + 1
+      end = find(FRAME_TERMINATOR, start)
+
+    if start < len(data):
+      self._buffer += data[start:]
+
+  def write(self, frame: bytes):
+    """Queues a frame to be written, queued frames are written together once the current callbacks complete"""
+    if self._closed.done():
+      raise ConnectionResetError('Connection lost')
+    self._pending_writes.append(frame)
+    if self._flush_handle is None:
+      self._flush_handle = self._loop.call_soon(self._flush_writes)
+
+  def _flush_writes(self):
+    """Writes the queued frames to the transport (internal)"""
+    self._flush_handle = None
+    if self._transport is None or self._transport.is_closing():
+      self._pending_writes.clear()
+      return
+
+    batch = self._pending_writes[:self._max_write_batch]
+    del self._pending_writes[:self._max_write_batch]
+    if len(batch) == 1:
+      self._transport.write(batch[0])
+    else:
+      self._transport.writelines(batch)
+
+    if self._pending_writes:
+      self._flush_handle = self._loop.call_soon(self._flush_writes)
+
+  def eof_received(self) -> bool:
+    #let the transport close itself
+    return False
+
+  def pause_writing(self):
+    self._paused = True
+
+  def resume_writing(self):
+    self._paused = False
+    self._wake_drain_waiters()
+
+  async def drain(self):
+    """Waits until it's appropriate to write to the transport again"""
+    if self._transport is None or self._closed.done():
+      raise ConnectionResetError('Connection lost')
+    if not self._paused:
+      return
+    waiter = self._loop.create_future()
+    self._drain_waiters.append(waiter)
+    await waiter
+
+  async def wait_closed(self) -> Optional[Exception]:
+    """Waits for the connection to be lost, returning the error that caused it (if any)"""
+    return await asyncio.shield(self._closed)
+
+  def _wake_drain_waiters(self, exc: Optional[Exception] = None):
+    while self._drain_waiters:
+      waiter = self._drain_waiters.popleft()
+      if not waiter.done():
+        if exc is None:
+          waiter.set_result(None)
+        else:
+          waiter.set_exception(exc)
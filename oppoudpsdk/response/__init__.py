@@ -17,4 +17,5 @@
 from .response import OppoUpdatePowerStatusResponse
 from .response import OppoUpdatePlayStatusResponse
 from .response import OppoUpdateTimeResponse
+from .mutator import OppoStateChanges, merge_changes, record_change
 from .factory import get_response
\ No newline at end of file
@@ -1,71 +1,80 @@
-from typing import Any, Tuple, Type
+import logging
+from typing import Any, Dict, NamedTuple, Tuple, Type
 from ..const import *
+from .. import tracing
 from .response import *
 from .mutator import *
 
+_LOGGER = logging.getLogger(__name__)
+
 class ResponseMapping(NamedTuple):
   """Represents a combination of response and mutator which is used to handle a response"""
   response_type: Type
   mutator: OppoStateMutator
 
+#pre-interned lookups so that frames can be classified without decoding them first
+_CODE_TABLE = { code.value.encode(): code for code in OppoCode }  # type: Dict[bytes, OppoCode]
+_RESULT_TABLE = { result.value.encode(): result for result in ResultCode }  # type: Dict[bytes, ResultCode]
+_POWER_VALUES = ["ON","OFF"]
+_NOP_MUTATOR = OppoNopMutator()
+
 def get_response(message: bytes) -> OppoResponse:
   """Gets the response for a given message."""
-  parsed = _parse_message(message)
+  tracer = tracing.tracer
+  if tracer is None:
+    return _get_response(message)
+  with tracer.start_as_current_span(tracing.SPAN_PARSE) as span:
+    response = _get_response(message)
+    span.set_attribute(tracing.ATTR_CODE, getattr(response.code, "value", response.code))
+    return response
 
-  #if we don't have a code, and the parameters are on/off, assume power code
-  if parsed.code == "" and len(parsed.parameters) > 0 and parsed.parameters[0] in ["ON","OFF"]:
-    parsed = OppoParsedResponse("QPW", parsed.result, parsed.parameters)
+def _get_response(message: bytes) -> OppoResponse:
+  parsed = parse_frame(message)
 
-  try:
-    tcode = _translate_code(parsed.code)
-    if tcode in _MAPPING:
-      mapping =_MAPPING[tcode]
+  mapping = _MAPPING.get(parsed.code)
+  if mapping is not None:
+    try:
       return mapping.response_type(parsed, mapping.mutator, message)
-  except:
-    pass
-
-  return OppoResponse(parsed, OppoNopMutator(), message) 
-
-def _parse_message(message: bytes) -> OppoParsedResponse:
-  """Parses a message received to identify the code, result, and parameters """
-  decoded = message.decode()
-
-  try:
-    segments = decoded[:-1].split(" ")
-    
-    p_code = segments[0][1:]
-
-    #must be wrong verbose mode, don't have the actual code
-    if p_code in ["OK","ER"]:
-      p_result = p_code
-      p_code = ""
-      p_parameters = segments[1:]
-    #update codes don't have a result...
-    elif p_code.startswith('U'):
-      p_result = "OK"
-      p_parameters = segments[1:]
-    else:
-      p_result = segments[1]
-      p_parameters = segments[2:]
-  except:
-    p_code = ""
-    p_result = "ER"
-    p_parameters = [] 
-
-  return OppoParsedResponse(
-    code = p_code,
-    result = p_result,
-    parameters = p_parameters
-  )
-
-def _translate_code(code: OppoCodeType):
-  try:
-    if isinstance(code, str):
-      return OppoCode(code)    
-  except:
+    except:
+      pass
+
+  return OppoResponse(parsed, _NOP_MUTATOR, message) 
+
+def parse_frame(frame: bytes) -> OppoParsedResponse:
+  """Parses a received frame (i.e. @CODE RESULT PARAMETERS\\r) to identify the code, result, and parameters """
+  end = len(frame)
+  if frame.endswith(b"\r"):
+    end -= 1
+
+  space = frame.find(b" ", 1, end)
+  if space < 0:
+    space = end
+  token = frame[1:space]
+  start = space + 1
+
+  code = _CODE_TABLE.get(token)
+  if code is None:
+    result = _RESULT_TABLE.get(token)
+    if result is not None:
+      #must be wrong verbose mode, don't have the actual code
+      payload = frame[start:end].decode(errors="replace")
+      #if the parameters are on/off, assume power code
+      if payload.split(" ", 1)[0] in _POWER_VALUES:
+        return OppoParsedResponse(OppoCode.QPW, result, payload)
+      return OppoParsedResponse("", result, payload)
+
+    code = token.decode(errors="replace")
     _LOGGER.info(f'Unexpected code received: {code}')
-    pass
-  return code  
+
+  #update codes don't have a result...
+  if token[:1] == b"U":
+    return OppoParsedResponse(code, ResultCode.OK, frame[start:end].decode(errors="replace"))
+
+  space = frame.find(b" ", start, end)
+  if space < 0:
+    space = end
+  result = _RESULT_TABLE.get(frame[start:space], ResultCode.ERROR)
+  return OppoParsedResponse(code, result, frame[space + 1:end].decode(errors="replace"))
 
 _MAPPING = {
   OppoCode.QPW: ResponseMapping(OppoPowerResponse, OppoSimpleDeviceMutator('status',ATTR_DEVICE_POWER_STATUS)),
@@ -1,5 +1,7 @@
 from .enums import *
 
+_UPDATE_PLAY_STATUS_VALUES = { status.value: status for status in UpdatePlayStatus }
+
 _UPDATE_PLAY_STATUS_TO_PLAY_STATUS = {
   UpdatePlayStatus.PLAY: PlayStatus.PLAY,
   UpdatePlayStatus.PAUSED: PlayStatus.PAUSE,
@@ -64,6 +66,14 @@
   UpdatePlayStatus.SREV_5: SpeedMode.SLOW_1_32,
 }
 
+_UPDATE_PLAY_STATUS_TO_FWD_SPEED_MODE = { 
+  k: v for k, v in _UPDATE_PLAY_STATUS_TO_SPEED_MODE.items() if 'FW' in k.value
+}
+
+_UPDATE_PLAY_STATUS_TO_REV_SPEED_MODE = { 
+  k: v for k, v in _UPDATE_PLAY_STATUS_TO_SPEED_MODE.items() if 'RV' in k.value
+}
+
 _UPDATE_DISC_TYPE_TO_DISC_TYPE = {
   UpdateDiscType.UNKNOWN: DiscType.UNKNOWN,
   UpdateDiscType.BLURAY: DiscType.BLURAY,
@@ -1,8 +1,9 @@
 import abc
 from datetime import timedelta
-from typing import TYPE_CHECKING
-import magicattr
+from operator import attrgetter
+from typing import Any, Callable, Dict, Tuple, TYPE_CHECKING
 
+from ..const import PLAYBACK_DRIFT_TOLERANCE
 from .enums import VolumeLevel
 
 if TYPE_CHECKING:
@@ -15,119 +16,183 @@
     OppoCurrentTotalResponse
   )
 
+#how far a time update can be from the extrapolated playback clock before re-anchoring
+PLAYBACK_EXTRAPOLATION_TOLERANCE = timedelta(seconds=PLAYBACK_DRIFT_TOLERANCE)
+
+#attribute name -> (old value, new value) for each attribute that changed
+OppoStateChanges = Dict[str, Tuple[Any, Any]]
+
+def record_change(changes: OppoStateChanges, name: str, old: Any, new: Any) -> None:
+  """Records a change, keeping the earliest old value and dropping changes that were reverted"""
+  if name in changes:
+    old = changes[name][0]
+  if old != new:
+    changes[name] = (old, new)
+  else:
+    changes.pop(name, None)
+
+def merge_changes(changes: OppoStateChanges, other: OppoStateChanges) -> None:
+  """Merges a later set of changes into a set of changes"""
+  for name, (old, new) in other.items():
+    record_change(changes, name, old, new)
+
+def _assign(changes: OppoStateChanges, target: Any, name: str, value: Any) -> None:
+  """Sets an attribute on the target, recording the change if the value differs"""
+  old = getattr(target, name)
+  setattr(target, name, value)
+  record_change(changes, name, old, value)
+
+def _compile_assigner(path: str) -> Callable[[Any, Any, OppoStateChanges], None]:
+  """Compiles a (dotted) attribute path into a function that assigns the attribute on an object"""
+  parent, _, name = path.rpartition('.')
+  if not parent:
+    return lambda obj, value, changes: _assign(changes, obj, name, value)
+  get_parent = attrgetter(parent)
+  return lambda obj, value, changes: _assign(changes, get_parent(obj), name, value)
+
+def _reset_playback_attributes(device: 'OppoDevice', changes: OppoStateChanges) -> None:
+  """Resets the playback attributes of the device, recording the attributes that changed"""
+  device.playback_attributes.reset(changes)
+
 class OppoStateMutator(metaclass=abc.ABCMeta):
   """Represents a mutator that can act on an OppoDevice to change its state"""
   def __init__(self) -> None:
     pass
 
   @abc.abstractmethod
-  async def mutate_state(self, device: 'OppoDevice', response: 'OppoResponse') -> None:
-    """ Mutates the state of the device based on the response """
+  def mutate_state(self, device: 'OppoDevice', response: 'OppoResponse') -> OppoStateChanges:
+    """ Mutates the state of the device based on the response, returning the attributes that changed """
     pass
 
 class OppoNopMutator(OppoStateMutator):
-  async def mutate_state(self, device: 'OppoDevice', response: 'OppoResponse') -> None:
-    pass
+  def mutate_state(self, device: 'OppoDevice', response: 'OppoResponse') -> OppoStateChanges:
+    return {}
 
 class OppoSimpleDeviceMutator(OppoStateMutator):
   def __init__(self, response_attr: str, device_attr: str) -> None:
     self.response_attr = response_attr
     self.device_attr = device_attr
+    self._get_value = attrgetter(response_attr)
+    self._assign_value = _compile_assigner(device_attr)
 
-  async def mutate_state(self, device: 'OppoDevice', response: 'OppoResponse') -> None:
-    magicattr.set(device, self.device_attr, magicattr.get(response, self.response_attr))
+  def mutate_state(self, device: 'OppoDevice', response: 'OppoResponse') -> OppoStateChanges:
+    changes = {}
+    self._assign_value(device, self._get_value(response), changes)
+    return changes
 
 class OppoSimplePlaybackMutator(OppoStateMutator):
   def __init__(self, response_attr: str, playback_attr: str) -> None:
     self.response_attr = response_attr
     self.playback_attr = playback_attr
+    self._get_value = attrgetter(response_attr)
+    self._assign_value = _compile_assigner(f'playback_attributes.{playback_attr}')
 
-  async def mutate_state(self, device: 'OppoDevice', response: 'OppoResponse') -> None:
-    magicattr.set(device, f'playback_attributes.{self.playback_attr}', magicattr.get(response, self.response_attr))
+  def mutate_state(self, device: 'OppoDevice', response: 'OppoResponse') -> OppoStateChanges:
+    changes = {}
+    self._assign_value(device, self._get_value(response), changes)
+    return changes
 
 class OppoVolumeLevelMutator(OppoStateMutator):
-  async def mutate_state(self, device: 'OppoDevice', response: 'OppoVolumeLevelResponse') -> None:
+  def mutate_state(self, device: 'OppoDevice', response: 'OppoVolumeLevelResponse') -> OppoStateChanges:
+    changes = {}
     if isinstance(response.level, int):
-      device.volume = response.level
+      _assign(changes, device, 'volume', response.level)
       if response.level > 0:
-        device.is_muted = False
+        _assign(changes, device, 'is_muted', False)
     else:
-      device.is_muted = response.level == VolumeLevel.MUTE 
+      _assign(changes, device, 'is_muted', response.level == VolumeLevel.MUTE)
+    return changes
 
 class OppoUpdatePlayStatusMutator(OppoStateMutator):
-  async def mutate_state(self, device: 'OppoDevice', response: 'OppoUpdatePlayStatusResponse') -> None:
-    from ..device import OppoPlaybackStatus
+  def mutate_state(self, device: 'OppoDevice', response: 'OppoUpdatePlayStatusResponse') -> OppoStateChanges:
+    changes = {}
     if response.tray_status:
       if device.tray_status != response.tray_status:
-        device.tray_status = response.tray_status
-        device.playback_attributes = OppoPlaybackStatus()
+        _assign(changes, device, 'tray_status', response.tray_status)
+        _reset_playback_attributes(device, changes)
     if response.fwd_speed_mode:
-      device.playback_attributes.fwd_speed = response.fwd_speed_mode
+      _assign(changes, device.playback_attributes, 'fwd_speed', response.fwd_speed_mode)
     if response.rev_speed_mode:
-      device.playback_attributes.fwd_speed = response.rev_speed_mode
+      _assign(changes, device.playback_attributes, 'rev_speed', response.rev_speed_mode)
+    return changes
 
 class OppoUpdateTimeMutator(OppoStateMutator):
-  async def mutate_state(self, device: 'OppoDevice', response: 'OppoUpdateTimeResponse') -> None:
+  def mutate_state(self, device: 'OppoDevice', response: 'OppoUpdateTimeResponse') -> OppoStateChanges:
+    changes = {}
+    pa = device.playback_attributes
     needs_media_refresh = True if (
-      device.playback_attributes.chapter != response.chapter_number or 
-      device.playback_attributes.track != response.title_number
+      pa.chapter != response.chapter_number or 
+      pa.track != response.title_number
     ) else False
 
     if needs_media_refresh:
       if not device.is_updating:
-        await device.async_request_media_update()
+        device.schedule_media_update()
     else: 
-      device.playback_attributes.chapter = response.chapter_number
-      device.playback_attributes.track = response.title_number
-      
+      #when extrapolating, compare against where we expect playback to be
+      now = device.clock_time()
+      base = pa.extrapolated(now) if device.extrapolate_playback else pa
+
       #figure out the deltas
       diff = timedelta(0)
       if response.time_type == "E":
-        diff = response.time_value - device.playback_attributes.total_elapsed_time
+        diff = response.time_value - base.total_elapsed_time
       elif response.time_type == "T":
-        diff = response.time_value - device.playback_attributes.track_elapsed_time
+        diff = response.time_value - base.track_elapsed_time
       elif response.time_type == "C":
-        diff = response.time_value - device.playback_attributes.chapter_elapsed_time
+        diff = response.time_value - base.chapter_elapsed_time
       elif response.time_type == "R":
-        diff = response.time_value - device.playback_attributes.total_remaining_time
+        diff = -(response.time_value - base.total_remaining_time)
       elif response.time_type == "X":
-        diff = response.time_value - device.playback_attributes.track_remaining_time
+        diff = -(response.time_value - base.track_remaining_time)
       elif response.time_type == "K":
-        diff = response.time_value - device.playback_attributes.chapter_remaining_time
+        diff = -(response.time_value - base.chapter_remaining_time)
       
+      #nothing moved (i.e. a repeated update), or the extrapolated clock is 
+      #still in step with the device, so nothing to do
+      if not diff or (device.extrapolate_playback and abs(diff) < PLAYBACK_EXTRAPOLATION_TOLERANCE):
+        return changes
+
       #apply the deltas  
-      device.playback_attributes.total_elapsed_time += diff
-      device.playback_attributes.track_elapsed_time += diff
-      device.playback_attributes.chapter_elapsed_time += diff
-      device.playback_attributes.total_remaining_time -= diff
-      device.playback_attributes.track_remaining_time -= diff
-      device.playback_attributes.chapter_remaining_time -= diff
+      _assign(changes, pa, 'total_elapsed_time', base.total_elapsed_time + diff)
+      _assign(changes, pa, 'track_elapsed_time', base.track_elapsed_time + diff)
+      _assign(changes, pa, 'chapter_elapsed_time', base.chapter_elapsed_time + diff)
+      _assign(changes, pa, 'total_remaining_time', base.total_remaining_time - diff)
+      _assign(changes, pa, 'track_remaining_time', base.track_remaining_time - diff)
+      _assign(changes, pa, 'chapter_remaining_time', base.chapter_remaining_time - diff)
+      pa.anchor(now, device.playback_rate)
 
       #if our remaining times go negative, reset them and request an
       #update to hopefully fix them up...
       if (
-        device.playback_attributes.total_remaining_time <= timedelta(0) or
-        device.playback_attributes.track_remaining_time <= timedelta(0) or
-        device.playback_attributes.chapter_remaining_time <= timedelta(0)
+        pa.total_remaining_time <= timedelta(0) or
+        pa.track_remaining_time <= timedelta(0) or
+        pa.chapter_remaining_time <= timedelta(0)
       ):
-        device.playback_attributes.total_remaining_time = timedelta(0)
-        device.playback_attributes.track_remaining_time = timedelta(0)
-        device.playback_attributes.chapter_remaining_time = timedelta(0)
-        await device.async_request_media_update()
+        _assign(changes, pa, 'total_remaining_time', timedelta(0))
+        _assign(changes, pa, 'track_remaining_time', timedelta(0))
+        _assign(changes, pa, 'chapter_remaining_time', timedelta(0))
+        device.schedule_media_update()
+    return changes
 
 class OppoChapterTotalMutator(OppoStateMutator):
-  async def mutate_state(self, device: 'OppoDevice', response: 'OppoCurrentTotalResponse') -> None:
-    device.playback_attributes.chapter = response.current
-    device.playback_attributes.chapter_total = response.total
+  def mutate_state(self, device: 'OppoDevice', response: 'OppoCurrentTotalResponse') -> OppoStateChanges:
+    changes = {}
+    _assign(changes, device.playback_attributes, 'chapter', response.current)
+    _assign(changes, device.playback_attributes, 'chapter_total', response.total)
+    return changes
 
 class OppoTrackTotalMutator(OppoStateMutator):
-  async def mutate_state(self, device: 'OppoDevice', response: 'OppoCurrentTotalResponse') -> None:
-    device.playback_attributes.track = response.current
-    device.playback_attributes.track_total = response.total
+  def mutate_state(self, device: 'OppoDevice', response: 'OppoCurrentTotalResponse') -> OppoStateChanges:
+    changes = {}
+    _assign(changes, device.playback_attributes, 'track', response.current)
+    _assign(changes, device.playback_attributes, 'track_total', response.total)
+    return changes
 
 class OppoTrayStatusMutator(OppoStateMutator):
-  async def mutate_state(self, device: 'OppoDevice', response: 'OppoResponse') -> None:
-    from ..device import OppoPlaybackStatus
+  def mutate_state(self, device: 'OppoDevice', response: 'OppoResponse') -> OppoStateChanges:
+    changes = {}
     if device.tray_status != response.status:
-      device.tray_status = response.status
-      device.playback_attributes = OppoPlaybackStatus()
+      _assign(changes, device, 'tray_status', response.status)
+      _reset_playback_attributes(device, changes)
+    return changes
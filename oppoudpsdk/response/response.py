@@ -1,14 +1,17 @@
 import logging
-from datetime import datetime, timedelta
-from dataclasses import dataclass
-from typing import List, NamedTuple, Optional, TYPE_CHECKING
+from datetime import timedelta
+from typing import NamedTuple, Optional, Tuple, TYPE_CHECKING
 
 from ..codes import *
+from ..helpers import parse_time
+from .. import tracing
 from .enums import *
-from .mutator import OppoNopMutator, OppoStateMutator
+from .mutator import OppoNopMutator, OppoStateChanges, OppoStateMutator
 from .mapping import (
+  _UPDATE_PLAY_STATUS_VALUES,
   _UPDATE_PLAY_STATUS_TO_PLAY_STATUS, 
-  _UPDATE_PLAY_STATUS_TO_SPEED_MODE, 
+  _UPDATE_PLAY_STATUS_TO_FWD_SPEED_MODE, 
+  _UPDATE_PLAY_STATUS_TO_REV_SPEED_MODE, 
   _UPDATE_PLAY_STATUS_TO_TRAY_STATUS,
   _UPDATE_DISC_TYPE_TO_DISC_TYPE
 )
@@ -18,203 +21,251 @@
 
 _LOGGER = logging.getLogger(__name__)    
 
+#marks a response value that hasn't been decoded yet
+_UNDECODED = object()
+
 class OppoParsedResponse(NamedTuple):
-  code: str
-  result: str
-  parameters: List[str] = None
+  """A received frame, split into its code, result and (undecoded) parameter payload"""
+  code: OppoCodeType
+  result: ResultCode
+  payload: str = ""
 
-@dataclass(repr=True, eq=True)
 class OppoResponse:
   """Represents a response to a command or state update"""
-  code: OppoCodeType
-  result: ResultCode
-  _parameters: List[str]
-  _raw_value: Optional[str]
-  
+  __slots__ = ('code', 'result', '_parameters', '_raw_value', '_mutator', '_value')
+
   def __init__(self, parsed: OppoParsedResponse, mutator: OppoStateMutator = OppoNopMutator(), raw_value: Optional[str] = None, single_parameter: bool = True):
-    self.code = self._translate(parsed.code)
-    self.result = ResultCode(parsed.result)
+    self.code = parsed.code
+    self.result = parsed.result
     
     #note: many responses can have spaces, so by default
-    #we'll just rejoin all the rest of the parameters
-    #if we need to split again later, we can do that in a subclass
+    #we'll just keep all the parameters together
+    #if we need to split them, we can do that in a subclass
     if single_parameter:
-      self._parameters = [" ".join(parsed.parameters)]
+      self._parameters = [parsed.payload]
     else:
-      self._parameters = parsed.parameters
+      self._parameters = parsed.payload.split(" ") if parsed.payload else []
     self._raw_value = raw_value
     self._mutator = mutator
+    self._value = _UNDECODED
+
+  def __repr__(self) -> str:
+    return f"{self.__class__.__qualname__}(code={self.code!r}, result={self.result!r}, _parameters={self._parameters!r}, _raw_value={self._raw_value!r})"
+
+  def __eq__(self, other) -> bool:
+    if other.__class__ is not self.__class__:
+      return NotImplemented
+    return (
+      (self.code, self.result, self._parameters, self._raw_value) == 
+      (other.code, other.result, other._parameters, other._raw_value)
+    )
+
+  __hash__ = None
 
   @property
   def raw_value(self):
     return self._raw_value
 
-  def _translate(self, code: OppoCodeType):
-    try:
-      if isinstance(code, str):
-        return OppoCode(code)    
-    except:
-      _LOGGER.info(f'Unexpected code received: {code}')
-      pass
-    return code
+  @property
+  def value(self):
+    """The parsed value of the response, decoded on first access"""
+    if self._value is _UNDECODED:
+      self._value = self._decode()
+    return self._value
+
+  def _decode(self):
+    """Decodes the parameters into the response value (overridden by typed responses)"""
+    return self._parameters[0] if self._parameters else None
 
-  async def mutate_state(self, device: 'OppoDevice'):
-    await self._mutator.mutate_state(device, self)
+  def mutate_state(self, device: 'OppoDevice') -> OppoStateChanges:
+    """Mutates the state of the device based on the response, returning the attributes that changed"""
+    tracer = tracing.tracer
+    if tracer is None:
+      return self._mutator.mutate_state(device, self)
+    with tracer.start_as_current_span(tracing.SPAN_MUTATE, attributes={ tracing.ATTR_CODE: getattr(self.code, "value", self.code) }):
+      return self._mutator.mutate_state(device, self)
 
 class OppoStringResponse(OppoResponse):
-  @property
-  def value(self) -> str:
+  __slots__ = ()
+
+  def _decode(self) -> str:
     return self._parameters[0]
 
 class OppoIntResponse(OppoResponse):
-  @property
-  def value(self) -> str:
+  __slots__ = ()
+
+  def _decode(self) -> int:
     return int(self._parameters[0])
 
 class OppoTimeResponse(OppoResponse):
-  @property
-  def value(self) -> timedelta:
-    t = datetime.strptime(self._parameters[0],"%H:%M:%S")
-    return timedelta(hours=t.hour,minutes=t.minute,seconds=t.second)
+  __slots__ = ()
+
+  def _decode(self) -> timedelta:
+    return parse_time(self._parameters[0])
 
 class OppoPowerResponse(OppoResponse):
-  @property
-  def status(self) -> PowerStatus:
+  __slots__ = ()
+
+  def _decode(self) -> PowerStatus:
     return PowerStatus(self._parameters[0])
+  status = OppoResponse.value
 
 class OppoPlayResponse(OppoResponse):
-  @property
-  def status(self) -> PlayStatus:
+  __slots__ = ()
+
+  def _decode(self) -> PlayStatus:
     return PlayStatus(self._parameters[0])
+  status = OppoResponse.value
 
 class OppoHdmiModeResponse(OppoResponse):
-  @property
-  def mode(self) -> PlayStatus:
+  __slots__ = ()
+
+  def _decode(self) -> HdmiMode:
     return HdmiMode(self._parameters[0])
+  mode = OppoResponse.value
 
 class OppoVolumeLevelResponse(OppoResponse):
-  @property
-  def level(self) -> VolumeLevelType:
-    try:
+  __slots__ = ()
+
+  def _decode(self) -> VolumeLevelType:
+    if self._parameters[0].isdigit():
       return int(self._parameters[0])
-    except:
-      return VolumeLevel(self._parameters[0])
+    return VolumeLevel(self._parameters[0])
+  level = OppoResponse.value
 
 class OppoZoomModeResponse(OppoResponse):
+  __slots__ = ()
+
   def __init__(self, parsed: OppoParsedResponse, mutator: OppoStateMutator, raw_value: Optional[str] = None):
       super().__init__(parsed, mutator, raw_value, False)
-  @property
-  def mode(self) -> ZoomMode:
+  def _decode(self) -> ZoomMode:
     return ZoomMode(self._parameters[0])
+  mode = OppoResponse.value
 
 class OppoInputSourceResponse(OppoResponse):
+  __slots__ = ()
+
   def __init__(self, parsed: OppoParsedResponse, mutator: OppoStateMutator, raw_value: Optional[str] = None):
       super().__init__(parsed, mutator, raw_value, False)
-  @property
-  def source(self) -> InputSource:
+  def _decode(self) -> InputSource:
     return InputSource(self._parameters[0])
+  source = OppoResponse.value
 
 class OppoDiscTypeResponse(OppoResponse):
-  @property
-  def disc_type(self) -> DiscType:
+  __slots__ = ()
+
+  def _decode(self) -> DiscType:
     return DiscType(self._parameters[0])
+  disc_type = OppoResponse.value
 
 class OppoHdrSettingResponse(OppoResponse):
-  @property
-  def setting(self) -> HdrSetting:
+  __slots__ = ()
+
+  def _decode(self) -> HdrSetting:
     return HdrSetting(self._parameters[0])
+  setting = OppoResponse.value
 
 class OppoRepeatModeResponse(OppoResponse):
+  __slots__ = ()
+
   def __init__(self, parsed: OppoParsedResponse, mutator: OppoStateMutator, raw_value: Optional[str] = None):
       super().__init__(parsed, mutator, raw_value, False)
-  @property
-  def mode(self) -> RepeatMode:
+  def _decode(self) -> RepeatMode:
     return RepeatMode(self._parameters[0])
+  mode = OppoResponse.value
 
 class OppoVideo3dStatusResponse(OppoResponse):
-  @property
-  def status(self) -> Video3dStatus:
+  __slots__ = ()
+
+  def _decode(self) -> Video3dStatus:
     return Video3dStatus(self._parameters[0])
+  status = OppoResponse.value
 
 class OppoVideoHdrStatusResponse(OppoResponse):
-  @property
-  def status(self) -> VideoHdrStatus:
+  __slots__ = ()
+
+  def _decode(self) -> VideoHdrStatus:
     return VideoHdrStatus(self._parameters[0])
+  status = OppoResponse.value
 
 class OppoSpeedModeResponse(OppoResponse):
-  @property
-  def mode(self) -> SpeedMode:
+  __slots__ = ()
+
+  def _decode(self) -> SpeedMode:
     return SpeedMode(self._parameters[0])
+  mode = OppoResponse.value
 
 class OppoTrayStatusResponse(OppoResponse):
-  @property
-  def status(self) -> TrayStatus:
-    return TrayStatus(self._parameters[0])    
+  __slots__ = ()
+
+  def _decode(self) -> TrayStatus:
+    return TrayStatus(self._parameters[0])
+  status = OppoResponse.value
 
 class OppoCurrentTotalResponse(OppoResponse):
+  __slots__ = ()
+
+  def _decode(self) -> Tuple[int, int]:
+    current, _, total = self._parameters[0].partition('/')
+    return (int(current), int(total))
   @property
   def current(self) -> int:
-    return int(self._parameters[0].split('/')[0])  
+    return self.value[0]
   @property
   def total(self) -> int:
-    return int(self._parameters[0].split('/')[1])
+    return self.value[1]
 
 class OppoUpdatePowerStatusResponse(OppoResponse):
-  @property
-  def status(self) -> PowerStatus:
+  __slots__ = ()
+
+  def _decode(self) -> PowerStatus:
     return PowerStatus.ON if int(self._parameters[0]) == 1 else PowerStatus.OFF
+  status = OppoResponse.value
 
 class OppoUpdatePlayStatusResponse(OppoResponse):
-  @property
-  def update_status(self) -> UpdatePlayStatus:
-    return UpdatePlayStatus(self._parameters[0])
+  __slots__ = ()
+
+  def _decode(self) -> Optional[UpdatePlayStatus]:
+    return _UPDATE_PLAY_STATUS_VALUES.get(self._parameters[0])
+  update_status = OppoResponse.value
   @property
   def play_status(self) -> Optional[PlayStatus]:
-    try:
-      return _UPDATE_PLAY_STATUS_TO_PLAY_STATUS[self.update_status]
-    except:
-      return None
+    return _UPDATE_PLAY_STATUS_TO_PLAY_STATUS.get(self.value)
   @property
   def tray_status(self) -> Optional[TrayStatus]:
-    try:
-      return _UPDATE_PLAY_STATUS_TO_TRAY_STATUS[self.update_status]
-    except:
-      return None
+    return _UPDATE_PLAY_STATUS_TO_TRAY_STATUS.get(self.value)
   @property
   def fwd_speed_mode(self) -> Optional[SpeedMode]:
-    try:
-      if 'FW' in self.update_status.value:
-        return _UPDATE_PLAY_STATUS_TO_SPEED_MODE[self.update_status]
-    except:
-      pass
-    return None
+    return _UPDATE_PLAY_STATUS_TO_FWD_SPEED_MODE.get(self.value)
   @property
   def rev_speed_mode(self) -> Optional[SpeedMode]:
-    try:
-      if 'RV' in self.update_status.value:
-        return _UPDATE_PLAY_STATUS_TO_SPEED_MODE[self.update_status]
-    except:
-      pass
-    return None 
+    return _UPDATE_PLAY_STATUS_TO_REV_SPEED_MODE.get(self.value)
 
 class OppoUpdateDiscTypeResponse(OppoResponse):
-  @property
-  def disc_type(self) -> DiscType:
+  __slots__ = ()
+
+  def _decode(self) -> DiscType:
     return _UPDATE_DISC_TYPE_TO_DISC_TYPE[UpdateDiscType(self._parameters[0])]
+  disc_type = OppoResponse.value
 
 class OppoUpdateTimeResponse(OppoResponse):
+  __slots__ = ()
+
   def __init__(self, parsed: OppoParsedResponse, mutator: OppoStateMutator, raw_value: Optional[str] = None):
       super().__init__(parsed, mutator, raw_value, False)  
+  def _decode(self) -> Tuple[int, int, str, timedelta]:
+    """Decodes the (title number, chapter number, time type, time value) of the update"""
+    p = self._parameters
+    return (int(p[0]), int(p[1]), p[2], parse_time(p[3]))
   @property
-  def title_number(self):
-    return int(self._parameters[0])
+  def title_number(self) -> int:
+    return self.value[0]
   @property
-  def chapter_number(self):
-    return int(self._parameters[1])
+  def chapter_number(self) -> int:
+    return self.value[1]
   @property
-  def time_type(self):
-    return self._parameters[2]
+  def time_type(self) -> str:
+    return self.value[2]
   @property
   def time_value(self) -> timedelta:
-    t = datetime.strptime(self._parameters[3],"%H:%M:%S")
-    return timedelta(hours=t.hour,minutes=t.minute,seconds=t.second)  
\ No newline at end of file
+    return self.value[3]
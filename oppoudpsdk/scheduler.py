@@ -0,0 +1,243 @@
+import asyncio
+import heapq
+import itertools
+import logging
+from typing import Dict, List, Optional, Set, Tuple, TYPE_CHECKING
+
+from .const import *
+from .response import PlayStatus, PowerStatus
+
+if TYPE_CHECKING:
+    from .client import OppoClient
+    from .device import OppoPlaybackStatus
+
+_LOGGER = logging.getLogger(__name__)
+
+class OppoRefreshScheduler:
+  """
+  Periodically refreshes the device state for many clients from a single task.  Clients are
+  kept in a heap ordered by when they are next due, and at most max_concurrent refreshes
+  run at once so that a large fleet doesn't refresh in lock step.
+  """
+  def __init__(self, refresh_interval: float = DEFAULT_REFRESH_INTERVAL, max_concurrent: int = DEFAULT_MAX_CONCURRENT_REFRESHES, event_loop: Optional[asyncio.AbstractEventLoop] = None):
+    self._refresh_interval = refresh_interval
+    self._max_concurrent = max(1, max_concurrent)
+    self._loop = event_loop
+    self._clients = set()  # type: Set[OppoClient]
+    self._queue = []  # type: List[Tuple[float, int, OppoClient]]
+    self._entries = {}  # type: Dict[OppoClient, Tuple[float, int]]
+    self._counter = itertools.count()
+    self._refreshing = set()  # type: Set[asyncio.Task]
+    self._refreshing_clients = set()  # type: Set[OppoClient]
+    self._wakeup = None  # type: Optional[asyncio.Event]
+    self._task = None  # type: Optional[asyncio.Task]
+
+  def __contains__(self, client: 'OppoClient') -> bool:
+    return client in self._clients
+
+  def __len__(self) -> int:
+    return len(self._clients)
+
+  @property
+  def loop(self) -> asyncio.AbstractEventLoop:
+    """Gets the asyncio event loop"""
+    if self._loop is None:
+      self._loop = asyncio.get_event_loop()
+    return self._loop
+
+  @property
+  def refresh_interval(self) -> float:
+    """Gets the default number of seconds between refreshes"""
+    return self._refresh_interval
+
+  @property
+  def running(self) -> bool:
+    """Indicates whether the scheduler is running"""
+    return self._task is not None
+
+  def add(self, client: 'OppoClient', delay: Optional[float] = None):
+    """
+    Adds a client to the schedule (or reschedules it), by default it's due after its refresh 
+    interval.  If the client has no refresh interval it stays parked until it's rescheduled.
+    """
+    self._clients.add(client)
+    if delay is None:
+      delay = self.interval_for(client)
+    if delay is None:
+      self._entries.pop(client, None)
+    else:
+      self._push(client, self.loop.time() + delay)
+
+  def reschedule(self, client: 'OppoClient'):
+    """Re-evaluates a client's refresh interval (i.e. its state changed), bringing its next refresh forward if needed"""
+    if client not in self._clients or client in self._refreshing_clients:
+      return
+    delay = self.interval_for(client)
+    if delay is None:
+      return
+    entry = self._entries.get(client)
+    due = self.loop.time() + delay
+    if entry is None or due < entry[0]:
+      self._push(client, due)
+
+  def remove(self, client: 'OppoClient'):
+    """Removes a client from the schedule"""
+    self._clients.discard(client)
+    self._entries.pop(client, None)
+
+  def refresh_now(self, client: 'OppoClient'):
+    """Makes a client due for refresh immediately"""
+    self.add(client, 0)
+
+  def interval_for(self, client: 'OppoClient') -> Optional[float]:
+    """Gets the number of seconds until the client should next be refreshed (None to not refresh it)"""
+    return self._refresh_interval
+
+  def start(self):
+    """Starts running the scheduled refreshes"""
+    if self._task is None:
+      self._wakeup = asyncio.Event()
+      self._task = self.loop.create_task(self._async_run())
+
+  async def async_stop(self):
+    """Stops running the scheduled refreshes, cancelling any refreshes in progress"""
+    task, self._task = self._task, None
+    tasks = list(self._refreshing)
+    if task is not None:
+      tasks.append(task)
+    for t in tasks:
+      t.cancel()
+    if tasks:
+      await asyncio.gather(*tasks, return_exceptions=True)
+
+  async def async_refresh(self, client: 'OppoClient'):
+    """Refreshes a client's device state"""
+    await client.device.async_request_update()
+
+  def _push(self, client: 'OppoClient', due: float):
+    """Queues the client's next refresh, replacing any earlier entry (internal)"""
+    seq = next(self._counter)
+    self._entries[client] = (due, seq)
+    heapq.heappush(self._queue, (due, seq, client))
+    #wake the scheduler if this is now the next refresh due
+    if self._wakeup is not None and self._queue[0][1] == seq:
+      self._wakeup.set()
+
+  async def _async_run(self):
+    """Starts the refreshes as they come due (internal)"""
+    slots = asyncio.Semaphore(self._max_concurrent)
+    while True:
+      self._wakeup.clear()
+      now = self.loop.time()
+      while self._queue and self._queue[0][0] <= now:
+        _, seq, client = heapq.heappop(self._queue)
+        #entries are replaced rather than removed, so skip any that are stale
+        entry = self._entries.get(client)
+        if entry is None or entry[1] != seq:
+          continue
+        del self._entries[client]
+        self._refreshing_clients.add(client)
+        task = self.loop.create_task(self._async_refresh(client, slots))
+        self._refreshing.add(task)
+        task.add_done_callback(self._refreshing.discard)
+
+      timeout = self._queue[0][0] - now if self._queue else None
+      try:
+        await asyncio.wait_for(self._wakeup.wait(), timeout)
+      except asyncio.TimeoutError:
+        pass
+
+  async def _async_refresh(self, client: 'OppoClient', slots: asyncio.Semaphore):
+    """Refreshes a client and schedules its next refresh (internal)"""
+    try:
+      async with slots:
+        if client.available and not client.device.is_updating:
+          await self.async_refresh(client)
+    except asyncio.CancelledError:
+      raise
+    except Exception:
+      _LOGGER.warning(f"Error refreshing device at {client.host_name}.", exc_info=True)
+    finally:
+      self._refreshing_clients.discard(client)
+      #unless it was removed or rescheduled while refreshing
+      if client in self._clients and client not in self._entries:
+        self.add(client)
+
+#play states where the device is idle (refreshed slowly)
+IDLE_PLAY_STATUSES = [
+  PlayStatus.HOME_MENU,
+  PlayStatus.MEDIA_CENTER,
+  PlayStatus.SCREEN_SAVER,
+  PlayStatus.SETUP,
+  PlayStatus.DISC_MENU,
+]
+
+class OppoAdaptiveRefreshScheduler(OppoRefreshScheduler):
+  """
+  Refresh scheduler that adapts each device's cadence to what it's doing.  Playing devices 
+  get a fast media refresh, idle devices (menus, screen saver) a slow full refresh and 
+  devices that are off are not refreshed at all (they report when they're turned on).
+
+  While playing, the interval doubles (up to max_playing_interval) each time the position
+  the device's playback clock extrapolated to (at its playback rate) agrees with the device 
+  to within the drift tolerance, and drops back to playing_interval as soon as it drifts.
+  """
+  def __init__(
+    self, 
+    playing_interval: float = DEFAULT_PLAYING_REFRESH_INTERVAL, 
+    max_playing_interval: float = DEFAULT_MAX_PLAYING_REFRESH_INTERVAL, 
+    idle_interval: float = DEFAULT_IDLE_REFRESH_INTERVAL, 
+    drift_tolerance: float = PLAYBACK_DRIFT_TOLERANCE, 
+    **kwargs
+  ):
+    super().__init__(**kwargs)
+    self._playing_interval = playing_interval
+    self._max_playing_interval = max(playing_interval, max_playing_interval)
+    self._idle_interval = idle_interval
+    self._drift_tolerance = drift_tolerance
+    self._cadence = {}  # type: Dict[OppoClient, float]
+    #the playback status (and its clock anchor) as of each client's last refresh
+    self._anchors = {}  # type: Dict[OppoClient, OppoPlaybackStatus]
+
+  def remove(self, client: 'OppoClient'):
+    super().remove(client)
+    self._cadence.pop(client, None)
+    self._anchors.pop(client, None)
+
+  def interval_for(self, client: 'OppoClient') -> Optional[float]:
+    device = client.device
+    if device.power_status == PowerStatus.OFF or device.playback_status == PlayStatus.OFF:
+      return None
+    if device.playback_status in IDLE_PLAY_STATUSES:
+      return self._idle_interval
+    if device.is_playing:
+      return self._cadence.get(client, self._playing_interval)
+    return self._refresh_interval
+
+  def drift_for(self, client: 'OppoClient') -> Optional[float]:
+    """Gets how far (in seconds) the device's position is from the local extrapolation, None if it can't be predicted"""
+    anchor = self._anchors.get(client)
+    if anchor is None or anchor.anchored_at is None:
+      return None
+    device = client.device
+    predicted = anchor.extrapolated(device.clock_time())
+    return abs((device.playback_attributes.total_elapsed_time - predicted.total_elapsed_time).total_seconds())
+
+  async def async_refresh(self, client: 'OppoClient'):
+    device = client.device
+    if not device.is_playing:
+      self._cadence.pop(client, None)
+      self._anchors.pop(client, None)
+      await device.async_request_update()
+      return
+
+    await device.async_request_media_update()
+
+    drift = self.drift_for(client)
+    if drift is not None and drift <= self._drift_tolerance:
+      self._cadence[client] = min(self._cadence.get(client, self._playing_interval) * 2, self._max_playing_interval)
+    else:
+      self._cadence[client] = self._playing_interval
+
+    #the refresh re-anchored the playback clock at the device's current rate
+    self._anchors[client] = device.playback_attributes.copy()
@@ -0,0 +1,501 @@
+"""
+Protocol level simulator for an Oppo player, for testing and load testing clients without
+real hardware.
+
+  python -m oppoudpsdk.simulator [--port 23] [--count 1] [--latency 0.01] [--drop-rate 0.05]
+
+Each simulated device listens on its own port and answers the query, set and remote codes
+in codes.py, honours the verbose modes in SetVerboseMode and sends UPW/UPL/UDT/UTC updates
+as its state changes.  Latency, jitter, dropped responses and errors can be configured, and
+the random choices are seeded so that a run can be reproduced.
+"""
+import argparse
+import asyncio
+import logging
+import random
+from typing import Dict, List, Optional, Set
+
+from .codes import OppoQueryCode, OppoRemoteCode, OppoSetCode
+from .command.enums import SetRepeatMode, SetVerboseMode
+from .response.enums import DiscType, PlayStatus, RepeatMode, UpdateDiscType, UpdatePlayStatus
+from .response.mapping import _UPDATE_DISC_TYPE_TO_DISC_TYPE, _UPDATE_PLAY_STATUS_TO_PLAY_STATUS
+
+_LOGGER = logging.getLogger(__name__)
+
+#seconds between time code updates in verbose mode
+DEFAULT_UTC_INTERVAL = 1.0
+
+#play status reported in the UPL updates (the first update status for each play status)
+_PLAY_STATUS_UPDATES = {}  # type: Dict[PlayStatus, UpdatePlayStatus]
+for _update, _status in _UPDATE_PLAY_STATUS_TO_PLAY_STATUS.items():
+  _PLAY_STATUS_UPDATES.setdefault(_status, _update)
+_DISC_TYPE_UPDATES = { disc_type: update for update, disc_type in _UPDATE_DISC_TYPE_TO_DISC_TYPE.items() }
+
+_REPEAT_MODES = {
+  SetRepeatMode.CHAPTER.value: RepeatMode.REPEAT_CHAPTER,
+  SetRepeatMode.TRACK.value: RepeatMode.REPEAT_TITLE,
+  SetRepeatMode.ALL.value: RepeatMode.REPEAT_ALL,
+  SetRepeatMode.OFF.value: RepeatMode.OFF,
+  SetRepeatMode.SHUFFLE.value: RepeatMode.SHUFFLE,
+  SetRepeatMode.RANDOM.value: RepeatMode.RANDOM,
+}
+
+#set codes which change the value reported by a query
+_SET_QUERY_CODES = {
+  OppoSetCode.SHD: OppoQueryCode.QHD,
+  OppoSetCode.SZM: OppoQueryCode.QZM,
+  OppoSetCode.SSH: OppoQueryCode.QSH,
+  OppoSetCode.SOP: OppoQueryCode.QOP,
+  OppoSetCode.SHR: OppoQueryCode.QHR,
+  OppoSetCode.SIS: OppoQueryCode.QIS,
+}
+
+#codes the device answers while it's in standby
+_STANDBY_CODES = { OppoQueryCode.QPW.value, OppoQueryCode.QVM.value, OppoQueryCode.QVR.value, OppoSetCode.SVM.value,
+                   OppoRemoteCode.POW.value, OppoRemoteCode.PON.value, OppoRemoteCode.POF.value }
+
+#a playing Blu-ray
+DEFAULT_SETTINGS = {
+  OppoQueryCode.QVR: "UDP20X-54-1231",
+  OppoQueryCode.QHD: "AUTO",
+  OppoQueryCode.QZM: RepeatMode.OFF.value,
+  OppoQueryCode.QSH: "0",
+  OppoQueryCode.QOP: "0",
+  OppoQueryCode.QRP: RepeatMode.OFF.value,
+  OppoQueryCode.QHR: "Auto",
+  OppoQueryCode.QIS: "0",
+  OppoQueryCode.Q3D: "2D",
+  OppoQueryCode.QHS: "HDR",
+  OppoQueryCode.QAT: "DTS-HD 1/3 English",
+  OppoQueryCode.QST: "1/4 English",
+  OppoQueryCode.QFT: "MKV",
+  OppoQueryCode.QFN: "movie.mkv",
+  OppoQueryCode.QTN: "Feature",
+  OppoQueryCode.QTA: "Album",
+  OppoQueryCode.QTP: "Performer",
+  OppoQueryCode.QDS: "1080P",
+  OppoQueryCode.QAR: "16WW",
+}
+
+class _Connection:
+  """A client connected to the simulator (internal)"""
+  __slots__ = ('writer', 'task', 'verbose_mode', 'sent_at')
+
+  def __init__(self, writer: asyncio.StreamWriter, task: asyncio.Task):
+    self.writer = writer
+    self.task = task
+    self.verbose_mode = SetVerboseMode.OFF
+    self.sent_at = 0.0
+
+class OppoSimulatedDevice:
+  """
+  A simulated device listening on a TCP port.  Responses are delayed by latency plus a
+  random jitter (keeping their order), drop_rate is the fraction of commands that are
+  never answered and error_rate the fraction answered with an error.  Specific codes can
+  always be dropped or failed with drop_codes/error_codes, to reproduce timeouts exactly.
+  """
+  def __init__(
+    self,
+    host: str = "127.0.0.1",
+    port: int = 0,
+    latency: float = 0.0,
+    jitter: float = 0.0,
+    drop_rate: float = 0.0,
+    error_rate: float = 0.0,
+    utc_interval: Optional[float] = DEFAULT_UTC_INTERVAL,
+    seed: Optional[int] = None,
+    event_loop: Optional[asyncio.AbstractEventLoop] = None
+  ):
+    self.host = host
+    self.latency = latency
+    self.jitter = jitter
+    self.drop_rate = drop_rate
+    self.error_rate = error_rate
+    self.drop_codes = set()  # type: Set[str]
+    self.error_codes = set()  # type: Set[str]
+    self.commands_received = 0
+    self.responses_dropped = 0
+    self._port = port
+    self._utc_interval = utc_interval
+    self._random = random.Random(seed)
+    self._loop = event_loop
+    self._server = None  # type: Optional[asyncio.AbstractServer]
+    self._connections = []  # type: List[_Connection]
+    self._ticker = None  # type: Optional[asyncio.Task]
+
+    self.settings = { code.value: value for code, value in DEFAULT_SETTINGS.items() }  # type: Dict[str, str]
+    self.powered = True
+    self.play_status = PlayStatus.PLAY
+    self.volume = 25
+    self.muted = False
+    self.time_code_mode = "E"
+    self.disc_type = DiscType.BLURAY
+    self.cddb_id = "12345678"
+    self.title = 1
+    self.titles = 5
+    self.chapters = 12
+    self.chapter_length = 600
+    self.position = 62.0
+
+  @property
+  def loop(self) -> asyncio.AbstractEventLoop:
+    """Gets the asyncio event loop"""
+    if self._loop is None:
+      self._loop = asyncio.get_event_loop()
+    return self._loop
+
+  @property
+  def port(self) -> int:
+    """Gets the port the device is listening on"""
+    if self._server is not None:
+      return self._server.sockets[0].getsockname()[1]
+    return self._port
+
+  @property
+  def connections(self) -> int:
+    """Gets the number of connected clients"""
+    return len(self._connections)
+
+  @property
+  def title_length(self) -> int:
+    """Gets the length of the current title in seconds"""
+    return self.chapters * self.chapter_length
+
+  @property
+  def chapter(self) -> int:
+    """Gets the current chapter"""
+    return min(int(self.position // self.chapter_length), self.chapters - 1) + 1
+
+  async def start(self):
+    """Starts listening for clients"""
+    self._server = await asyncio.start_server(self._handle, self.host, self._port)
+    if self._utc_interval:
+      self._ticker = self.loop.create_task(self._async_tick())
+
+  async def stop(self):
+    """Disconnects the clients and stops listening"""
+    if self._ticker is not None:
+      self._ticker.cancel()
+      await asyncio.gather(self._ticker, return_exceptions=True)
+      self._ticker = None
+    connections, self._connections = self._connections, []
+    for connection in connections:
+      connection.writer.close()
+    #let the handlers see the connections close
+    await asyncio.gather(*[c.task for c in connections], return_exceptions=True)
+    if self._server is not None:
+      self._server.close()
+      await self._server.wait_closed()
+      self._server = None
+
+  def power_on(self):
+    """Turns the device on, as if from the front panel"""
+    if not self.powered:
+      self.powered = True
+      self.play_status = PlayStatus.HOME_MENU
+      self._notify("UPW", "1")
+      self._notify("UPL", self._play_status_update())
+
+  def power_off(self):
+    """Puts the device in standby, as if from the front panel"""
+    if self.powered:
+      self.powered = False
+      self.play_status = PlayStatus.OFF
+      self._notify("UPW", "0")
+
+  def set_play_status(self, status: PlayStatus):
+    """Changes the play status, as if from the front panel"""
+    if self.play_status != status:
+      self.play_status = status
+      self._notify("UPL", self._play_status_update())
+
+  def load_disc(self, disc_type: DiscType = DiscType.BLURAY, cddb_id: Optional[str] = None, titles: int = 5, chapters: int = 12, **settings):
+    """Loads a disc and starts playing it, settings are query values to report for it (i.e. QTN="Title")"""
+    if cddb_id is None:
+      cddb_id = f"{self._random.getrandbits(64):016X}"
+    self.disc_type = disc_type
+    self.cddb_id = cddb_id
+    self.titles, self.chapters = titles, chapters
+    self.title, self.position = 1, 0.0
+    self.settings.update(settings)
+    self._notify("UDT", _DISC_TYPE_UPDATES.get(disc_type, UpdateDiscType.UNKNOWN).value)
+    self.set_play_status(PlayStatus.PLAY)
+
+  def answer(self, command: str, verbose_mode: SetVerboseMode = SetVerboseMode.VERBOSE) -> Optional[str]:
+    """Gets the response (i.e. CODE OK VALUE) for a command without its framing, or None to not respond"""
+    code, _, parameter = command.partition(" ")
+    if code in self.drop_codes or self._random.random() < self.drop_rate:
+      self.responses_dropped += 1
+      return None
+    if code in self.error_codes or self._random.random() < self.error_rate:
+      return f"{code} ER INVALID"
+    if not self.powered and code not in _STANDBY_CODES:
+      return f"{code} ER OFF"
+
+    handler = getattr(self, f"_handle_{code.lower()}", None)
+    try:
+      if code == OppoQueryCode.QVM.value:
+        value = verbose_mode.value
+      elif code == OppoQueryCode.QCD.value:
+        #answered as two responses, each with half of the id
+        half = len(self.cddb_id) // 2
+        return f"QC1 OK {self.cddb_id[:half]}\rQC2 OK {self.cddb_id[half:]}"
+      elif handler is not None:
+        value = handler(parameter)
+      elif code in self.settings:
+        value = self.settings[code]
+      elif code in _SET_CODES:
+        value = self._handle_set(OppoSetCode(code), parameter)
+      elif code in _REMOTE_CODES:
+        value = ""
+      else:
+        return f"{code} ER INVALID"
+    except (KeyError, ValueError):
+      return f"{code} ER INVALID"
+    return f"{code} OK {value}" if value else f"{code} OK"
+
+  async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Handles the commands from a client (internal)"""
+    connection = _Connection(writer, asyncio.current_task())
+    self._connections.append(connection)
+    _LOGGER.debug(f"Client connected to simulated device on port {self.port}")
+    try:
+      while True:
+        frame = await reader.readuntil(b"\r")
+        self.commands_received += 1
+        command = frame.lstrip(b"#").rstrip(b"\r").decode(errors="replace")
+        response = self.answer(command, connection.verbose_mode)
+        if response is None:
+          continue
+        if command.startswith(OppoSetCode.SVM.value) and " OK" in response:
+          connection.verbose_mode = SetVerboseMode(command[4:])
+        self._respond(connection, response)
+    except (asyncio.IncompleteReadError, ConnectionError):
+      pass
+    finally:
+      if connection in self._connections:
+        self._connections.remove(connection)
+
+  def _respond(self, connection: _Connection, response: str):
+    """Sends a response after the latency, in the order the commands were received (internal)"""
+    responses = response.split("\r")
+    if connection.verbose_mode == SetVerboseMode.OFF:
+      #the code is omitted in verbose mode 0
+      responses = [r.split(" ", 1)[1] for r in responses]
+    frames = "".join(f"@{r}\r" for r in responses).encode()
+
+    delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+    if not delay:
+      connection.writer.write(frames)
+      return
+    connection.sent_at = max(self.loop.time() + delay, connection.sent_at)
+    self.loop.call_at(connection.sent_at, self._write, connection, frames)
+
+  def _write(self, connection: _Connection, data: bytes):
+    """Writes to a client unless it has disconnected (internal)"""
+    if connection in self._connections:
+      connection.writer.write(data)
+
+  def _notify(self, code: str, value: str, verbose_mode: SetVerboseMode = SetVerboseMode.INFO):
+    """Sends an update to the clients in (at least) the verbose mode (internal)"""
+    frame = f"@{code} {value}\r".encode()
+    for connection in self._connections:
+      if int(connection.verbose_mode.value) >= int(verbose_mode.value):
+        self._write(connection, frame)
+
+  async def _async_tick(self):
+    """Advances the playback position and sends the time code updates (internal)"""
+    while True:
+      await asyncio.sleep(self._utc_interval)
+      if not self.powered or self.play_status != PlayStatus.PLAY:
+        continue
+      self.position += self._utc_interval
+      if self.position >= self.title_length:
+        self.position = 0.0
+        self.title = self.title % self.titles + 1
+      self._notify("UTC", f"{self.title:03} {self.chapter:03} {self.time_code_mode} {self._time_code()}", SetVerboseMode.VERBOSE)
+
+  def _play_status_update(self) -> str:
+    """Gets the UPL value for the play status (internal)"""
+    update = _PLAY_STATUS_UPDATES.get(self.play_status)
+    return update.value if update is not None else UpdatePlayStatus.STOPPED.value
+
+  def _time_code(self) -> str:
+    """Gets the time for the time code mode (internal)"""
+    chapter_start = (self.chapter - 1) * self.chapter_length
+    seconds = {
+      "E": self.position,
+      "R": self.title_length - self.position,
+      "T": self.position,
+      "X": self.title_length - self.position,
+      "C": self.position - chapter_start,
+      "K": chapter_start + self.chapter_length - self.position,
+    }.get(self.time_code_mode, self.position)
+    return _format_time(seconds)
+
+  def _set_power(self, powered: bool) -> str:
+    if powered:
+      self.power_on()
+    else:
+      self.power_off()
+    return "ON" if self.powered else "OFF"
+
+  def _handle_qpw(self, parameter: str) -> str:
+    return "ON" if self.powered else "OFF"
+
+  def _handle_qvl(self, parameter: str) -> str:
+    return "MUTE" if self.muted else str(self.volume)
+
+  def _handle_qpl(self, parameter: str) -> str:
+    return self.play_status.value
+
+  def _handle_qtk(self, parameter: str) -> str:
+    return f"{self.title:02}/{self.titles:02}"
+
+  def _handle_qch(self, parameter: str) -> str:
+    return f"{self.chapter:02}/{self.chapters:02}"
+
+  def _handle_qte(self, parameter: str) -> str:
+    return _format_time(self.position)
+
+  def _handle_qtr(self, parameter: str) -> str:
+    return _format_time(self.title_length - self.position)
+
+  def _handle_qce(self, parameter: str) -> str:
+    return _format_time(self.position - (self.chapter - 1) * self.chapter_length)
+
+  def _handle_qcr(self, parameter: str) -> str:
+    return _format_time(self.chapter * self.chapter_length - self.position)
+
+  _handle_qel = _handle_qte
+  _handle_qre = _handle_qtr
+
+  def _handle_qdt(self, parameter: str) -> str:
+    return self.disc_type.value
+
+
+  def _handle_qrp(self, parameter: str) -> str:
+    return self.settings[OppoQueryCode.QRP.value]
+
+  def _handle_svm(self, parameter: str) -> str:
+    SetVerboseMode(parameter)
+    return parameter
+
+  def _handle_svl(self, parameter: str) -> str:
+    if parameter == "MUTE":
+      self.muted = True
+    else:
+      self.volume, self.muted = max(0, min(100, int(parameter))), False
+    return self._handle_qvl(parameter)
+
+  def _handle_srp(self, parameter: str) -> str:
+    self.settings[OppoQueryCode.QRP.value] = _REPEAT_MODES[parameter].value
+    return parameter
+
+  def _handle_stc(self, parameter: str) -> str:
+    self.time_code_mode = parameter
+    return parameter
+
+  def _handle_set(self, code: OppoSetCode, parameter: str) -> str:
+    query = _SET_QUERY_CODES.get(code)
+    if query is not None:
+      self.settings[query.value] = parameter
+    return parameter
+
+  def _handle_pow(self, parameter: str) -> str:
+    return self._set_power(not self.powered)
+
+  def _handle_pon(self, parameter: str) -> str:
+    return self._set_power(True)
+
+  def _handle_pof(self, parameter: str) -> str:
+    return self._set_power(False)
+
+  def _handle_pla(self, parameter: str) -> str:
+    self.set_play_status(PlayStatus.PLAY)
+    return self.play_status.value
+
+  def _handle_pau(self, parameter: str) -> str:
+    self.set_play_status(PlayStatus.PAUSE if self.play_status != PlayStatus.PAUSE else PlayStatus.PLAY)
+    return self.play_status.value
+
+  def _handle_stp(self, parameter: str) -> str:
+    self.set_play_status(PlayStatus.STOP)
+    self.position = 0.0
+    return self.play_status.value
+
+  def _handle_hom(self, parameter: str) -> str:
+    self.set_play_status(PlayStatus.HOME_MENU)
+    return ""
+
+  def _handle_nxt(self, parameter: str) -> str:
+    self.position = min(self.chapter, self.chapters - 1) * self.chapter_length
+    return ""
+
+  def _handle_pre(self, parameter: str) -> str:
+    self.position = max(self.chapter - 2, 0) * self.chapter_length
+    return ""
+
+  def _handle_vup(self, parameter: str) -> str:
+    self.volume, self.muted = min(self.volume + 1, 100), False
+    return str(self.volume)
+
+  def _handle_vdn(self, parameter: str) -> str:
+    self.volume, self.muted = max(self.volume - 1, 0), False
+    return str(self.volume)
+
+  def _handle_mut(self, parameter: str) -> str:
+    self.muted = not self.muted
+    return "MUTE" if self.muted else "UNMUTE"
+
+  def _handle_ejt(self, parameter: str) -> str:
+    if self.play_status == PlayStatus.OPEN:
+      self.play_status = PlayStatus.CLOSE
+      self._notify("UPL", UpdatePlayStatus.TRAY_CLOSING.value)
+      return "CLOSE"
+    self.play_status, self.disc_type = PlayStatus.OPEN, DiscType.NONE
+    self._notify("UPL", UpdatePlayStatus.TRAY_OPEN.value)
+    return "OPEN"
+
+_SET_CODES = { code.value for code in OppoSetCode }
+_REMOTE_CODES = { code.value for code in OppoRemoteCode }
+
+def _format_time(seconds: float) -> str:
+  seconds = max(int(seconds), 0)
+  return f"{seconds // 3600:02}:{seconds // 60 % 60:02}:{seconds % 60:02}"
+
+async def _async_main(args: argparse.Namespace):
+  devices = [
+    OppoSimulatedDevice(
+      args.host, args.port + i if args.port else 0, args.latency, args.jitter, args.drop_rate, args.error_rate,
+      args.utc_interval, None if args.seed is None else args.seed + i
+    )
+    for i in range(args.count)
+  ]
+  for device in devices:
+    await device.start()
+    print(f"simulated device listening on {device.host}:{device.port}")
+  try:
+    await asyncio.Event().wait()
+  finally:
+    for device in devices:
+      await device.stop()
+
+def main():
+  parser = argparse.ArgumentParser(description="Runs simulated Oppo devices")
+  parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+  parser.add_argument("--port", type=int, default=0, help="port of the first device (0 for any free port)")
+  parser.add_argument("--count", type=int, default=1, help="number of devices, on consecutive ports")
+  parser.add_argument("--latency", type=float, default=0.0, help="response latency in seconds")
+  parser.add_argument("--jitter", type=float, default=0.0, help="maximum random extra latency in seconds")
+  parser.add_argument("--drop-rate", type=float, default=0.0, help="fraction of commands that aren't answered")
+  parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of commands answered with an error")
+  parser.add_argument("--utc-interval", type=float, default=DEFAULT_UTC_INTERVAL, help="seconds between time code updates")
+  parser.add_argument("--seed", type=int, default=None, help="random seed, for reproducible runs")
+  try:
+    asyncio.run(_async_main(parser.parse_args()))
+  except KeyboardInterrupt:
+    pass
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,101 @@
+"""
+Optional tracing of the client's hot paths.  Spans are started around sending a command
+(oppo.send_command), parsing a received frame (oppo.parse), applying a response to the device
+state (oppo.mutate), running event handlers (oppo.dispatch) and device refreshes (oppo.refresh).
+
+Any tracer with an OpenTelemetry style start_as_current_span(name, attributes=None) context
+manager, whose spans support set_attribute, can be installed with set_tracer, i.e.
+set_tracer(opentelemetry.trace.get_tracer("oppoudpsdk")).  OppoMemoryTracer keeps the spans
+in memory for tests.  When no tracer is installed the hot paths only check for None.
+"""
+import contextlib
+import contextvars
+import time
+from collections import deque
+from typing import Any, Callable, ContextManager, Deque, Dict, Iterator, List, Optional
+
+SPAN_SEND_COMMAND = "oppo.send_command"
+SPAN_PARSE = "oppo.parse"
+SPAN_MUTATE = "oppo.mutate"
+SPAN_DISPATCH = "oppo.dispatch"
+SPAN_REFRESH = "oppo.refresh"
+
+ATTR_CODE = "oppo.code"
+ATTR_EVENT = "oppo.event"
+ATTR_HOST = "oppo.host"
+ATTR_REFRESH = "oppo.refresh.kind"
+
+#the installed tracer, read directly by the hot paths (use set_tracer to change it)
+tracer = None  # type: Optional[Any]
+
+def set_tracer(new_tracer: Optional[Any]):
+  """Installs a tracer for the spans (None to stop tracing)"""
+  global tracer
+  tracer = new_tracer
+
+def span(name: str, attributes: Optional[Dict[str, Any]] = None) -> ContextManager:
+  """Starts a span with the installed tracer, or does nothing if there isn't one"""
+  if tracer is None:
+    return contextlib.nullcontext()
+  return tracer.start_as_current_span(name, attributes=attributes)
+
+class OppoSpan:
+  """A span recorded by the in-memory tracer, times are from the tracer's clock"""
+  __slots__ = ('name', 'attributes', 'parent', 'start_time', 'end_time', 'exception')
+
+  def __init__(self, name: str, attributes: Optional[Dict[str, Any]], parent: Optional['OppoSpan'], start_time: float):
+    self.name = name
+    self.attributes = dict(attributes) if attributes else {}
+    self.parent = parent
+    self.start_time = start_time
+    self.end_time = None  # type: Optional[float]
+    self.exception = None  # type: Optional[BaseException]
+
+  def __repr__(self) -> str:
+    return f"OppoSpan(name={self.name!r}, attributes={self.attributes!r}, duration={self.duration!r})"
+
+  @property
+  def duration(self) -> Optional[float]:
+    """Gets the duration of the span in seconds (None if it hasn't ended)"""
+    if self.end_time is None:
+      return None
+    return self.end_time - self.start_time
+
+  def set_attribute(self, key: str, value: Any):
+    self.attributes[key] = value
+
+  def record_exception(self, exception: BaseException):
+    self.exception = exception
+
+class OppoMemoryTracer:
+  """Tracer that keeps the finished spans in memory (the most recent max_spans, if given)"""
+  def __init__(self, max_spans: Optional[int] = None, clock: Callable[[], float] = time.perf_counter):
+    self._clock = clock
+    self._current = contextvars.ContextVar("oppo_current_span", default=None)
+    self.spans = deque(maxlen=max_spans)  # type: Deque[OppoSpan]
+
+  @contextlib.contextmanager
+  def start_as_current_span(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> Iterator[OppoSpan]:
+    current = OppoSpan(name, attributes, self._current.get(), self._clock())
+    token = self._current.set(current)
+    try:
+      yield current
+    except BaseException as err:
+      current.record_exception(err)
+      raise
+    finally:
+      self._current.reset(token)
+      current.end_time = self._clock()
+      self.spans.append(current)
+
+  def find(self, name: str) -> List[OppoSpan]:
+    """Gets the finished spans with a name"""
+    return [s for s in self.spans if s.name == name]
+
+  def children(self, parent: OppoSpan) -> List[OppoSpan]:
+    """Gets the finished spans started within a span"""
+    return [s for s in self.spans if s.parent is parent]
+
+  def clear(self):
+    """Removes the finished spans"""
+    self.spans.clear()
@@ -39,5 +39,5 @@
     ],
     packages=find_namespace_packages(include=[base_package, f"{base_package}*"]),
     include_package_data=False,
-    install_requires=["magicattr"]
+    install_requires=[]
 )
@@ -0,0 +1,40 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, List, Tuple
+
+from oppoudpsdk import EVENT_COMMAND_SENT, EVENT_READY, OppoClient, PowerStatus
+from oppoudpsdk.simulator import OppoSimulatedDevice
+
+async def wait_until(predicate: Callable[[], bool], timeout: float = 5):
+  """Waits for a condition to become true, failing the test if it doesn't in time"""
+  deadline = asyncio.get_event_loop().time() + timeout
+  while not predicate():
+    if asyncio.get_event_loop().time() > deadline:
+      raise AssertionError("Timed out waiting for condition")
+    await asyncio.sleep(0.01)
+
+def record_sent(client: OppoClient) -> List[str]:
+  """Records the codes of the commands the client sends"""
+  sent = []  # type: List[str]
+  client.add_event_handler(EVENT_COMMAND_SENT, lambda command: sent.append(command.code.value))
+  return sent
+
+@asynccontextmanager
+async def connected(latency: float = 0.002, **client_options) -> AsyncIterator[Tuple[OppoSimulatedDevice, OppoClient]]:
+  """Runs a client connected to a simulated device, once the device's initial refresh has completed"""
+  simulator = OppoSimulatedDevice(latency=latency, utc_interval=None)
+  await simulator.start()
+  client = OppoClient("127.0.0.1", simulator.port, **client_options)
+  ready = asyncio.Event()
+  client.add_event_handler(EVENT_READY, lambda c: ready.set())
+  task = asyncio.ensure_future(client.async_run_client())
+  try:
+    await asyncio.wait_for(ready.wait(), 5)
+    #the device reports it's on, which triggers a full refresh
+    await wait_until(lambda: client.device.power_status == PowerStatus.ON and client.device.playback_attributes.track)
+    await wait_until(lambda: not client.device.is_updating)
+    yield simulator, client
+  finally:
+    await client.disconnect()
+    await task
+    await simulator.stop()
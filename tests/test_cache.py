@@ -0,0 +1,87 @@
+from oppoudpsdk import OppoDiscCache, OppoQueryCommand, OppoResponseCache
+from oppoudpsdk.codes import OppoQueryCode
+from oppoudpsdk.response import get_response
+
+class FakeClock:
+  def __init__(self):
+    self.now = 0.0
+
+  def __call__(self) -> float:
+    return self.now
+
+def _cache(clock: FakeClock) -> OppoResponseCache:
+  return OppoResponseCache(ttls={ OppoQueryCode.QVR: 60, OppoQueryCode.QDT: 10 }, clock=clock)
+
+def test_responses_expire_after_their_ttl():
+  clock = FakeClock()
+  cache = _cache(clock)
+  command = OppoQueryCommand(OppoQueryCode.QDT)
+  cache.put(command, get_response(b"@QDT OK BD-MV\r"))
+
+  clock.now = 9.9
+  assert cache.get(command).raw_value == b"@QDT OK BD-MV\r"
+  clock.now = 10.0
+  assert cache.get(command) is None
+  assert len(cache) == 0
+  assert (cache.hits, cache.misses) == (1, 1)
+
+def test_only_successful_plain_queries_with_a_ttl_are_cached():
+  cache = _cache(FakeClock())
+  cache.put(OppoQueryCommand(OppoQueryCode.QVR), get_response(b"@QVR ER INVALID\r"))
+  cache.put(OppoQueryCommand(OppoQueryCode.QVL), get_response(b"@QVL OK 25\r"))
+  assert len(cache) == 0
+  assert cache.get(OppoQueryCommand(OppoQueryCode.QVL)) is None
+
+def test_related_updates_invalidate_cached_responses():
+  cache = _cache(FakeClock())
+  version, disc_type = OppoQueryCommand(OppoQueryCode.QVR), OppoQueryCommand(OppoQueryCode.QDT)
+  cache.put(version, get_response(b"@QVR OK UDP20X-53-0627\r"))
+  cache.put(disc_type, get_response(b"@QDT OK BD-MV\r"))
+
+  #a disc type update only drops the disc type
+  cache.on_message_received(get_response(b"@UDT DVD-VIDEO\r"))
+  assert cache.get(disc_type) is None
+  assert cache.get(version) is not None
+
+  #a power update drops everything
+  cache.put(disc_type, get_response(b"@QDT OK BD-MV\r"))
+  cache.on_message_received(get_response(b"@UPW 0\r"))
+  assert len(cache) == 0
+
+def test_invalidate():
+  cache = _cache(FakeClock())
+  version, disc_type = OppoQueryCommand(OppoQueryCode.QVR), OppoQueryCommand(OppoQueryCode.QDT)
+  cache.put(version, get_response(b"@QVR OK UDP20X-53-0627\r"))
+  cache.put(disc_type, get_response(b"@QDT OK BD-MV\r"))
+  cache.invalidate([OppoQueryCode.QDT])
+  assert cache.get(disc_type) is None
+  assert cache.get(version) is not None
+  cache.invalidate()
+  assert len(cache) == 0
+
+def test_disc_cache_keeps_track_metadata_per_track():
+  cache = OppoDiscCache()
+  cache.put("12345678", { "QFT": b"@QFT OK MKV\r" })
+  cache.put_track("12345678", 1, { "QTN": b"@QTN OK Feature\r" })
+  cache.put_track("12345678", 3, { "QTN": b"@QTN OK Bonus\r" })
+
+  assert cache.get("12345678") == { "QFT": b"@QFT OK MKV\r" }
+  assert cache.get_track("12345678", 1) == { "QTN": b"@QTN OK Feature\r" }
+  assert cache.get_track("12345678", 3) == { "QTN": b"@QTN OK Bonus\r" }
+  assert cache.get_track("12345678", 2) is None
+
+  cache.remove("12345678")
+  assert cache.get_track("12345678", 1) is None
+
+def test_disc_cache_evicts_the_least_recently_used_discs():
+  cache = OppoDiscCache(max_entries=2)
+  cache.put("a", {})
+  cache.put_track("a", 1, { "QTN": b"@QTN OK A\r" })
+  cache.put("b", {})
+  cache.get("a")
+  cache.put("c", {})
+
+  assert "a" in cache and "c" in cache and "b" not in cache
+  cache.put("d", {})
+  assert "a" not in cache
+  assert cache.get_track("a", 1) is None
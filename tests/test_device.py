@@ -0,0 +1,88 @@
+import asyncio
+
+import oppoudpsdk.client
+import oppoudpsdk.device
+from oppoudpsdk import PowerStatus
+from oppoudpsdk.simulator import OppoSimulatedDevice
+
+from support import connected, record_sent, wait_until
+
+VERIFY_CODES = {"QPW", "QPL", "QDT", "QCD"}
+
+async def _reconnect(simulator: OppoSimulatedDevice, client, configure=None):
+  """Drops the connection, then brings up a new simulated device on the same port, returning the codes sent once it's verified"""
+  await simulator.stop()
+  await wait_until(lambda: not client.available)
+  replacement = OppoSimulatedDevice(port=client.port_number, latency=simulator.latency, utc_interval=None)
+  if configure is not None:
+    configure(replacement)
+  sent = record_sent(client)
+  await replacement.start()
+  await wait_until(lambda: client.available)
+  await wait_until(lambda: VERIFY_CODES <= set(sent) and not client.device.is_updating)
+  #let any refresh started by the verification finish
+  await asyncio.sleep(0.1)
+  await wait_until(lambda: not client.device.is_updating)
+  return replacement, sent
+
+def _fast_reconnects(monkeypatch):
+  monkeypatch.setattr(oppoudpsdk.client, "RETRY_INTERVAL", 0.02)
+  monkeypatch.setattr(oppoudpsdk.client, "MAX_RETRY_INTERVAL", 0.05)
+
+def test_restored_state_is_verified_rather_than_refreshed(monkeypatch):
+  _fast_reconnects(monkeypatch)
+
+  async def run():
+    async with connected(pipeline_depth=8) as (simulator, client):
+      replacement, sent = await _reconnect(simulator, client)
+      try:
+        assert VERIFY_CODES <= set(sent)
+        #the disc didn't change, so there's no full refresh
+        assert "QVR" not in sent and "QVL" not in sent
+        assert client.device.power_status == PowerStatus.ON
+        assert client.device.volume == 25
+        assert client.device.cddb_id == "12345678"
+      finally:
+        await replacement.stop()
+
+  asyncio.run(run())
+
+def test_a_different_disc_is_refreshed_after_restoring(monkeypatch):
+  _fast_reconnects(monkeypatch)
+
+  def change_disc(replacement: OppoSimulatedDevice):
+    replacement.cddb_id = "87654321"
+    replacement.volume = 40
+
+  async def run():
+    async with connected(pipeline_depth=8) as (simulator, client):
+      replacement, sent = await _reconnect(simulator, client, change_disc)
+      try:
+        assert "QVR" in sent, " ".join(sent)
+        assert client.device.cddb_id == "87654321"
+        assert client.device.volume == 40
+      finally:
+        await replacement.stop()
+
+  asyncio.run(run())
+
+def test_stale_snapshots_are_not_restored(monkeypatch):
+  _fast_reconnects(monkeypatch)
+  monkeypatch.setattr(oppoudpsdk.device, "SNAPSHOT_MAX_AGE", 0.1)
+
+  def change_volume(replacement: OppoSimulatedDevice):
+    replacement.volume = 70
+
+  async def run():
+    async with connected(pipeline_depth=8) as (simulator, client):
+      await simulator.stop()
+      #stay disconnected for longer than the snapshot can be restored for
+      await asyncio.sleep(0.3)
+      replacement, sent = await _reconnect(simulator, client, change_volume)
+      try:
+        assert "QVL" in sent
+        assert client.device.volume == 70
+      finally:
+        await replacement.stop()
+
+  asyncio.run(run())
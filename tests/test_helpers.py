@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from oppoudpsdk.helpers import SingleFlight
+
+def test_calls_while_running_share_one_trailing_run():
+  async def run():
+    runs = []
+
+    async def operation():
+      runs.append(len(runs) + 1)
+      await asyncio.sleep(0.01)
+      return len(runs)
+
+    flight = SingleFlight(operation)
+    results = await asyncio.gather(*[flight.run() for _ in range(5)])
+    assert runs == [1, 2]
+    assert results == [1, 2, 2, 2, 2]
+    assert not flight.running
+
+    #once idle, the next call starts a new run
+    assert await flight.run() == 3
+
+  asyncio.run(run())
+
+def test_a_call_during_the_trailing_run_schedules_another():
+  async def run():
+    runs = []
+
+    async def operation():
+      runs.append(len(runs) + 1)
+      await asyncio.sleep(0.01)
+
+    flight = SingleFlight(operation)
+    first = asyncio.ensure_future(flight.run())
+    await asyncio.sleep(0)
+    trailing = asyncio.ensure_future(flight.run())
+    await first
+    await asyncio.sleep(0.005)
+    assert runs == [1, 2]
+    await asyncio.gather(trailing, flight.run())
+    assert runs == [1, 2, 3]
+
+  asyncio.run(run())
+
+def test_errors_are_raised_to_every_caller():
+  async def run():
+    async def operation():
+      await asyncio.sleep(0.01)
+      raise ValueError()
+
+    flight = SingleFlight(operation)
+    results = await asyncio.gather(flight.run(), flight.run(), return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+    assert not flight.running
+
+  asyncio.run(run())
+
+def test_cancelling_a_caller_does_not_cancel_the_run():
+  async def run():
+    finished = asyncio.Event()
+
+    async def operation():
+      await asyncio.sleep(0.01)
+      finished.set()
+
+    flight = SingleFlight(operation)
+    caller = asyncio.ensure_future(flight.run())
+    await asyncio.sleep(0)
+    caller.cancel()
+    with pytest.raises(asyncio.CancelledError):
+      await caller
+    await flight.wait()
+    assert finished.is_set()
+
+  asyncio.run(run())
+
+def test_wait_does_not_start_a_run():
+  async def run():
+    runs = []
+
+    async def operation():
+      runs.append(1)
+
+    flight = SingleFlight(operation)
+    await flight.wait()
+    assert runs == []
+
+  asyncio.run(run())
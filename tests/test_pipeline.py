@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+from oppoudpsdk import OppoCommandCancelledError, OppoCommandError, OppoQueryCommand, OppoRemoteCommand
+from oppoudpsdk.codes import OppoQueryCode, OppoRemoteCode
+from oppoudpsdk.pipeline import OppoCommandPipeline, OppoCommandQueue
+from oppoudpsdk.response import get_response
+
+from support import connected
+
+def test_untagged_responses_answer_the_oldest_command():
+  async def run():
+    loop = asyncio.get_event_loop()
+    pipeline = OppoCommandPipeline()
+    volume = pipeline.register(OppoQueryCommand(OppoQueryCode.QVL), loop.create_future())
+    power = pipeline.register(OppoQueryCommand(OppoQueryCode.QPW), loop.create_future())
+
+    assert pipeline.match(get_response(b"@OK 25\r")) is volume
+    assert volume.future.result().raw_value == b"@OK 25\r"
+    assert not power.future.done()
+
+    assert pipeline.match(get_response(b"@ER INVALID\r")) is power
+    assert power.future.result().raw_value == b"@ER INVALID\r"
+    assert len(pipeline) == 0
+    assert pipeline.match(get_response(b"@OK 25\r")) is None
+
+  asyncio.run(run())
+
+def test_tagged_responses_answer_the_oldest_command_expecting_the_code():
+  async def run():
+    loop = asyncio.get_event_loop()
+    pipeline = OppoCommandPipeline()
+    volume = pipeline.register(OppoQueryCommand(OppoQueryCode.QVL), loop.create_future())
+    first = pipeline.register(OppoQueryCommand(OppoQueryCode.QPW), loop.create_future())
+    second = pipeline.register(OppoQueryCommand(OppoQueryCode.QPW), loop.create_future())
+
+    assert pipeline.match(get_response(b"@QPW OK ON\r")) is first
+    assert pipeline.match(get_response(b"@QPW OK OFF\r")) is second
+    assert not volume.future.done()
+    #updates don't answer anything
+    assert pipeline.match(get_response(b"@UVL 30\r")) is None
+    assert not volume.future.done()
+
+  asyncio.run(run())
+
+def test_clear_fails_the_outstanding_commands():
+  async def run():
+    pipeline = OppoCommandPipeline()
+    pending = pipeline.register(OppoQueryCommand(OppoQueryCode.QVL), asyncio.get_event_loop().create_future())
+    pipeline.clear()
+    with pytest.raises(OppoCommandError):
+      pending.future.result()
+    assert len(pipeline) == 0
+
+  asyncio.run(run())
+
+def test_cancelled_commands_raise_cancelled_error():
+  async def run():
+    queue = OppoCommandQueue(1)
+    await queue.acquire(OppoQueryCommand(OppoQueryCode.QVL))
+    waiting = asyncio.ensure_future(queue.acquire(OppoQueryCommand(OppoQueryCode.QPW)))
+    await asyncio.sleep(0)
+    assert len(queue) == 1
+
+    assert queue.cancel() == 1
+    with pytest.raises(OppoCommandCancelledError):
+      await waiting
+    #the slot wasn't handed to the cancelled command
+    queue.release()
+    assert queue.free == 1
+
+  asyncio.run(run())
+
+def test_interactive_commands_are_sent_ahead_of_queued_queries():
+  async def run():
+    queue = OppoCommandQueue(1)
+    acquired = []
+
+    async def send(command):
+      await queue.acquire(command)
+      acquired.append(command)
+
+    await queue.acquire(OppoQueryCommand(OppoQueryCode.QVL))
+    query = asyncio.ensure_future(send(OppoQueryCommand(OppoQueryCode.QPW)))
+    await asyncio.sleep(0)
+    remote = asyncio.ensure_future(send(OppoRemoteCommand(OppoRemoteCode.PAU)))
+    await asyncio.sleep(0)
+
+    queue.release()
+    await remote
+    assert acquired == [OppoRemoteCommand(OppoRemoteCode.PAU)]
+    assert not query.done()
+    queue.release()
+    await query
+
+  asyncio.run(run())
+
+def test_client_cancels_queued_queries():
+  async def run():
+    async with connected(latency=0.05) as (_, client):
+      answered = client.send_command(OppoQueryCommand(OppoQueryCode.QVL))
+      await asyncio.sleep(0.01)
+      queued = client.send_command(OppoQueryCommand(OppoQueryCode.QPL))
+      await asyncio.sleep(0.01)
+
+      assert client.cancel_queued_commands() == 1
+      with pytest.raises(OppoCommandCancelledError):
+        await queued
+      assert (await answered).value == 25
+
+  asyncio.run(run())